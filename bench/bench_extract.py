@@ -0,0 +1,126 @@
+# Extraction backend benchmark and cross-check. Pages are taken from a run
+# against the fake eStudent; every backend is timed on every page, from the
+# raw bytes (decoding included), and its output is compared with the
+# BeautifulSoup extractor, which is the reference. "decode" is the bot's
+# declared-charset decode, "detect" what res.text costs when the response
+# declares no charset. extract_stream, the path the bot runs, is checked
+# too, with the body arriving in chunks of several sizes.
+#
+#   python -m bench.bench_extract --pad-kb 120 --repeat 50
+import argparse
+import io
+import logging
+import sys
+import time
+
+from requests.models import Response
+
+from bench.bench_reg import default_subjects
+from bench.fake_estudent import FakeEStudent
+from html_extract import (BACKENDS, CHUNK_SIZE, COMPONENT_ROWS, GROUP_OPTIONS, VIEW_STATE,
+                          SoupExtractor, page_encoding)
+from reg_core import CourseRegistrationSystem, logger
+
+FIELDS = (VIEW_STATE, GROUP_OPTIONS, COMPONENT_ROWS)
+STREAM_CHUNKS = (512, 4096, CHUNK_SIZE)
+
+
+class ChunkedBody(io.BytesIO):
+    # A socket that hands out at most `size` bytes per read
+    def __init__(self, content, size):
+        super().__init__(content)
+        self.size = size
+
+    def read(self, n=-1):
+        return super().read(self.size if n is None or n < 0 else min(n, self.size))
+
+
+def collect_pages(server, subjects):
+    bot = CourseRegistrationSystem("12345678A", "benchmark", base_url=server.base_url)
+    responses = []
+    bot.session.hooks["response"].append(lambda r, *a, **k: responses.append(r))
+    if not (bot.login() and bot.select_acad_year_sem()):
+        raise RuntimeError("could not reach subject selection on the fake server")
+    for code, group, comps in subjects:
+        bot.add_subject(code, group, comps)
+    bot.finalize()
+    return [(r.url.rsplit("/", 1)[-1], r.content, page_encoding(r, r.content))
+            for r in responses if b"javax.faces.ViewState" in r.content]
+
+
+def time_per_call(fn, repeat):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - t0) / repeat * 1000, result
+
+
+def detect_text(content):
+    # res.text on a response without a declared charset
+    res = Response()
+    res._content, res.encoding = content, None
+    return res.text
+
+
+def stream_response(content, encoding, size):
+    res = Response()
+    res.status_code = 200
+    res.headers["Content-Type"] = f"text/html; charset={encoding}"
+    res.raw = ChunkedBody(content, size)
+    return res
+
+
+def normalize(found):
+    out = dict(found)
+    out[COMPONENT_ROWS] = [(i, " ".join(t.split())) for i, t in found[COMPONENT_ROWS]]
+    out[GROUP_OPTIONS] = [(v, t.strip()) for v, t in found[GROUP_OPTIONS]]
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark and cross-check HTML extractors.")
+    ap.add_argument("--pad-kb", type=int, default=60)
+    ap.add_argument("--viewstate-bytes", type=int, default=0)
+    ap.add_argument("--repeat", type=int, default=20)
+    args = ap.parse_args()
+    logger.setLevel(logging.WARNING)
+
+    with FakeEStudent(pad_kb=args.pad_kb, viewstate_bytes=args.viewstate_bytes, seed=0) as server:
+        pages = collect_pages(server, default_subjects(2))
+
+    oracle = SoupExtractor()
+    backends = []
+    for name, cls in BACKENDS.items():
+        try:
+            backends.append(cls())
+        except ImportError:
+            print(f"{name}: not installed, skipped")
+
+    mismatches = 0
+    print(f"{'page':<44}{'KB':>7}{'decode ms':>11}{'detect ms':>11}"
+          + "".join(f"{b.name + ' ms':>11}" for b in backends))
+    for label, content, encoding in pages:
+        decode_ms, text = time_per_call(lambda: content.decode(encoding, errors="replace"),
+                                        args.repeat)
+        detect_ms, _ = time_per_call(lambda: detect_text(content), max(1, args.repeat // 10))
+        expected = normalize(oracle.extract(text, FIELDS))
+        cells = []
+        for b in backends:
+            ms, found = time_per_call(lambda: b.extract_bytes(content, encoding, FIELDS),
+                                      args.repeat)
+            cells.append(ms)
+            if normalize(found) != expected:
+                mismatches += 1
+                print(f"MISMATCH: {b.name} on {label}")
+            for size in STREAM_CHUNKS:
+                found = b.extract_stream(stream_response(content, encoding, size), FIELDS)
+                if normalize(found) != expected:
+                    mismatches += 1
+                    print(f"MISMATCH: {b.name} streaming in {size} B chunks on {label}")
+        print(f"{label[:42]:<44}{len(content) / 1024:>7.1f}{decode_ms:>11.2f}{detect_ms:>11.2f}"
+              + "".join(f"{c:>11.2f}" for c in cells))
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# End-to-end latency benchmark: runs the registration steps against the
+# local fake eStudent and reports time per step and overall time-to-confirm.
+#
+#   python -m bench.bench_reg --runs 10 --latency-ms 40 --pad-kb 80
+import argparse
+import json
+import logging
+import statistics
+import time
+
+from bench.fake_estudent import Catalogue, FakeEStudent, components_for, group_code
+from reg_core import CourseRegistrationSystem, logger
+
+
+def default_subjects(n):
+    subjects = []
+    for i in range(n):
+        g = i % 3
+        comps = [c for c, _ in components_for(g)][:2]
+        subjects.append([f"BENCH{1000 + i}", group_code(g), comps])
+    return subjects
+
+
+def run_once(server, subjects):
+    bot = CourseRegistrationSystem("12345678A", "benchmark", base_url=server.base_url)
+    timings = {}
+    t_start = time.perf_counter()
+
+    def step(name, fn, *args):
+        t0 = time.perf_counter()
+        ok = fn(*args)
+        timings[name] = time.perf_counter() - t0
+        if not ok:
+            raise RuntimeError(f"step '{name}' failed")
+
+    step("login", bot.login)
+    step("select_acad_year_sem", bot.select_acad_year_sem)
+    for i, (code, group, comps) in enumerate(subjects):
+        step(f"add_subject[{i}]", bot.add_subject, code, group, comps)
+    step("finalize", bot.finalize)
+    timings["time_to_confirm"] = time.perf_counter() - t_start
+    return timings, bot.trace
+
+
+def summarize(runs):
+    rows = []
+    for name in runs[0]:
+        values = sorted(r[name] for r in runs)
+        rows.append({
+            "step": name,
+            "min_ms": values[0] * 1000,
+            "median_ms": statistics.median(values) * 1000,
+            "max_ms": values[-1] * 1000,
+        })
+    return rows
+
+
+def print_table(rows):
+    print(f"{'step':<24}{'min ms':>10}{'median ms':>12}{'max ms':>10}")
+    for r in rows:
+        print(f"{r['step']:<24}{r['min_ms']:>10.1f}{r['median_ms']:>12.1f}{r['max_ms']:>10.1f}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Offline registration latency benchmark.")
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--warmup", type=int, default=1)
+    ap.add_argument("--subjects", type=int, default=3)
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    ap.add_argument("--jitter-ms", type=float, default=0.0)
+    ap.add_argument("--pad-kb", type=int, default=60)
+    ap.add_argument("--viewstate-bytes", type=int, default=0)
+    ap.add_argument("--json", help="write the raw timings and summary to this file")
+    ap.add_argument("--trace", action="store_true",
+                    help="print the per-request timeline of the last run")
+    ap.add_argument("--verbose", action="store_true")
+    args = ap.parse_args()
+
+    if args.verbose:
+        logging.basicConfig(format='%(asctime)s - %(message)s')
+    else:
+        logger.setLevel(logging.WARNING)
+
+    subjects = default_subjects(args.subjects)
+    server = FakeEStudent(latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000,
+                          pad_kb=args.pad_kb, viewstate_bytes=args.viewstate_bytes,
+                          catalogue=Catalogue(), seed=0)
+    with server:
+        for _ in range(args.warmup):
+            run_once(server, subjects)
+        results = [run_once(server, subjects) for _ in range(args.runs)]
+    runs = [timings for timings, _ in results]
+
+    rows = summarize(runs)
+    print(f"{args.runs} runs, {len(subjects)} subjects, latency {args.latency_ms:g} ms, "
+          f"padding {args.pad_kb} KB")
+    print_table(rows)
+    if args.trace:
+        print("\nRequest timeline of the last run:")
+        print("\n".join(results[-1][1].timeline()))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "runs": runs, "summary": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
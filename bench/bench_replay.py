@@ -0,0 +1,126 @@
+# Offline parser benchmark on captured eStudent pages (see capture.py).
+# Every page of a bundle goes through what the bot runs on it: decoding,
+# ViewState update, group lookup and component scan, once per extraction
+# backend.
+# Reports parse time per page and fixture size; exits 1 when a page no
+# longer yields what the bot needs, or when the bot's backend goes over
+# the per-page budget.
+#
+#   python reg_cli.py --now --capture
+#   python -m bench.bench_replay                   # every bundle in the data dir
+#   python -m bench.bench_replay capture-20250801-093000.zip --repeat 50 --budget-ms 5
+import argparse
+import logging
+import sys
+import time
+from pathlib import Path
+
+from capture import load_bundle
+from common import get_captures_dir, logger
+from html_extract import (BACKENDS, COMPONENT_ROWS, GROUP_OPTIONS, GROUP_SELECT_ID,
+                          VIEW_STATE, VIEW_STATE_NAME)
+from reg_core import CourseRegistrationSystem, parse_alternatives
+
+
+def fields_for(page, text):
+    # What the bot reads from this page, going by the step that fetched it
+    # as well as the markup, so a renamed element shows up as broken
+    step = page["step"] or ""
+    fields = []
+    if VIEW_STATE_NAME in text or (page["url"].endswith(".jsf") and page["status"] == 200
+                                   and not step.startswith("login") and step != "confirm"):
+        fields.append(VIEW_STATE)
+    if GROUP_SELECT_ID in text or step.endswith(": search"):
+        fields.append(GROUP_OPTIONS)
+    if "selectCompSelected_" in text or step.endswith(": add group"):
+        fields.append(COMPONENT_ROWS)
+    return tuple(fields)
+
+
+def subject_for(step, subjects):
+    code = (step or "").split(": ")[0]
+    for s in subjects:
+        if s[0] == code:
+            return s
+    return None
+
+
+def replay(bot, backend, content, fields, subject):
+    # One pass of the bot's work on a page; returns a problem or None.
+    # Bundles store pages as UTF-8.
+    found = backend.extract_bytes(content, "utf-8", fields)
+    if VIEW_STATE in fields and not bot.update_view_state(found):
+        return "no ViewState"
+    if subject is None:
+        return None
+    alternatives = parse_alternatives(subject[1], subject[2])
+    if GROUP_OPTIONS in fields and not bot.resolve_candidates(
+            subject[0], found[GROUP_OPTIONS], alternatives):
+        return f"group {subject[1]} not found"
+    if COMPONENT_ROWS in fields:
+        _, indices, problems = bot.resolve_component_sets(
+            found[COMPONENT_ROWS], [c for _, c in alternatives], partial=len(alternatives) == 1)
+        if not indices:
+            return "no matching components"
+        if problems:
+            return f"components {'; '.join(problems)}"
+    return None
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Replay captured pages through the parsers.")
+    ap.add_argument("bundles", nargs="*", type=Path,
+                    help="capture bundles (default: all in the data directory)")
+    ap.add_argument("--repeat", type=int, default=20)
+    ap.add_argument("--budget-ms", type=float, default=None,
+                    help="fail if the bot's backend needs longer than this on any page")
+    ap.add_argument("--budget-backend", default="scan")
+    args = ap.parse_args()
+    logger.setLevel(logging.WARNING)
+
+    bundles = args.bundles or sorted(get_captures_dir().glob("capture-*.zip"))
+    if not bundles:
+        print("No capture bundles found. Record one with: python reg_cli.py --now --capture")
+        sys.exit(1)
+    backends = []
+    for name, cls in BACKENDS.items():
+        try:
+            backends.append(cls())
+        except ImportError:
+            print(f"{name}: not installed, skipped")
+    bot = CourseRegistrationSystem("replay", "")
+
+    problems = 0
+    for path in bundles:
+        manifest, pages = load_bundle(path)
+        raw = sum(len(text.encode("utf-8")) for _, text in pages)
+        print(f"\n{path.name}: {len(pages)} pages, {raw / 1024:.0f} KB raw, "
+              f"{path.stat().st_size / 1024:.0f} KB bundled (v{manifest.get('version', '?')})")
+        print(f"{'page':<15}{'step':<28}{'KB':>7}" + "".join(f"{b.name + ' ms':>11}" for b in backends))
+        for page, text in pages:
+            fields = fields_for(page, text)
+            if not fields:
+                continue
+            subject = subject_for(page["step"], manifest.get("subjects", []))
+            content = text.encode("utf-8")
+            cells, notes = [], []
+            for b in backends:
+                t0 = time.perf_counter()
+                for _ in range(args.repeat):
+                    problem = replay(bot, b, content, fields, subject)
+                ms = (time.perf_counter() - t0) / args.repeat * 1000
+                cells.append(ms)
+                if problem:
+                    notes.append(f"BROKEN ({b.name}): {problem}")
+                elif (args.budget_ms is not None and b.name == args.budget_backend
+                      and ms > args.budget_ms):
+                    notes.append(f"OVER BUDGET ({b.name}): {ms:.2f} ms > {args.budget_ms:g} ms")
+            problems += len(notes)
+            name = Path(page["file"]).name
+            print(f"{name:<15}{(page['step'] or '-')[:27]:<28}{len(text) / 1024:>7.1f}"
+                  + "".join(f"{c:>11.2f}" for c in cells) + "".join(f"  {n}" for n in notes))
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+# Cold-start benchmark for the GUI: starts a fresh interpreter per run and
+# measures the wall time until the main window has been shown and painted,
+# and until the background preload of the network stack has finished.
+# Fails (exit 1) when the median time to window goes over the budget, or
+# when requests/urllib3/bs4 are imported before the window is up.
+#
+#   python -m bench.bench_startup --runs 5 --budget-ms 1500
+#   python -m bench.bench_startup --importtime 15
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+HEAVY = ("requests", "urllib3", "bs4", "lxml", "reg_core")
+
+CHILD = r"""
+import json, sys, time
+from PyQt6.QtWidgets import QApplication
+app = QApplication(sys.argv)
+import reg_GUI
+win = reg_GUI.MainWindow()
+win.show()
+heavy = [m for m in HEAVY if m in sys.modules]
+app.processEvents()
+print(json.dumps({"heavy": heavy}), flush=True)
+t0 = time.perf_counter()
+def ready():
+    # Modules appear in sys.modules when their import starts, so look for
+    # names defined at the end of them
+    return (hasattr(sys.modules.get("reg_core"), "RegistrationRun")
+            and hasattr(sys.modules.get("bs4"), "BeautifulSoup"))
+while not ready():
+    if time.perf_counter() - t0 > 30:
+        break
+    app.processEvents()
+    time.sleep(0.002)
+print("ready", flush=True)
+"""
+
+
+def child_env(offscreen):
+    env = dict(os.environ)
+    if offscreen:
+        env["QT_QPA_PLATFORM"] = "offscreen"
+    return env
+
+
+def run_once(offscreen):
+    code = f"HEAVY = {HEAVY!r}\n" + CHILD
+    t0 = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-c", code], cwd=ROOT, env=child_env(offscreen),
+                            stdout=subprocess.PIPE, text=True)
+    shown = json.loads(proc.stdout.readline())
+    shown["window_ms"] = (time.perf_counter() - t0) * 1000
+    proc.stdout.readline()
+    shown["ready_ms"] = (time.perf_counter() - t0) * 1000
+    proc.wait()
+    return shown
+
+
+def import_profile(module, top, offscreen):
+    # Biggest cumulative import times, from python -X importtime
+    res = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                         cwd=ROOT, env=child_env(offscreen), capture_output=True, text=True)
+    rows = []
+    for line in res.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            rows.append((int(parts[1]), parts[2].rstrip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Measure GUI cold start against a budget.")
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--budget-ms", type=float, default=1500.0,
+                    help="maximum median time from process start to window shown")
+    ap.add_argument("--importtime", type=int, metavar="N", default=0,
+                    help="also list the N slowest imports of reg_GUI and reg_cli")
+    ap.add_argument("--offscreen", action="store_true",
+                    default=sys.platform.startswith("linux") and not os.getenv("DISPLAY"),
+                    help="use Qt's offscreen platform (default when there is no display)")
+    args = ap.parse_args()
+
+    runs = [run_once(args.offscreen) for _ in range(args.runs)]
+    window = statistics.median(r["window_ms"] for r in runs)
+    ready = statistics.median(r["ready_ms"] for r in runs)
+    print(f"{'run':>4}{'window ms':>12}{'core ready ms':>16}")
+    for i, r in enumerate(runs):
+        print(f"{i:>4}{r['window_ms']:>12.0f}{r['ready_ms']:>16.0f}")
+    print(f"median: window {window:.0f} ms (budget {args.budget_ms:.0f} ms), "
+          f"core ready {ready:.0f} ms")
+
+    for module in ("reg_GUI", "reg_cli") if args.importtime else ():
+        print(f"\nslowest imports for {module} (cumulative us):")
+        for us, name in import_profile(module, args.importtime, args.offscreen):
+            print(f"{us:>10}  {name}")
+
+    failed = False
+    early = sorted({m for r in runs for m in r["heavy"]})
+    if early:
+        print(f"FAIL: imported before the window was shown: {', '.join(early)}")
+        failed = True
+    if window > args.budget_ms:
+        print(f"FAIL: median time to window {window:.0f} ms is over the {args.budget_ms:.0f} ms budget")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
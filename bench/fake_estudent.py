@@ -0,0 +1,525 @@
+# Local stand-in for the PolyU ADFS login and the eStudent JSF registration
+# pages, so CourseRegistrationSystem can be exercised offline.
+#
+#   python -m bench.fake_estudent --port 8080 --latency-ms 80 --pad-kb 60
+#
+# then point CourseRegistrationSystem(base_url=...) at the printed URL.
+import argparse
+import base64
+import html
+import os
+import random
+import secrets
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+ESTUDENT = "/eStudent/"
+REG = ESTUDENT + "secure/my-subject-registration/"
+ACAD_YEAR_SEM = REG + "subject-register-select-acad-year-sem.jsf"
+SELECT_SUBJECT = REG + "subject-register-select-subject.jsf"
+SELECT_COMPONENT = REG + "subject-register-select-component.jsf"
+PREVIEW = REG + "subject-register-preview-confirmation.jsf"
+HOME = ESTUDENT + "secure/home.jsf"
+SAML_CALLBACK = ESTUDENT + "SAML_callback"
+ADFS = "/adfs/ls/"
+
+DAYS = ["Mon", "Tue", "Wed", "Thu", "Fri"]
+
+
+# ==========================================
+# 1. Catalogue
+# ==========================================
+def group_code(index):
+    return f"{2001 + index}"
+
+
+def option_value(code, group):
+    return str(zlib.crc32(f"{code}/{group}".encode()) % 900000 + 100000)
+
+
+def components_for(group_index, tutorials_per_group=2):
+    # Group 2001 -> LTL001, T001, T002; group 2002 -> LTL002, T003, T004; ...
+    comps = [(f"LTL{group_index + 1:03d}", "Lecture")]
+    for k in range(tutorials_per_group):
+        comps.append(
+            (f"T{group_index * tutorials_per_group + k + 1:03d}", "Tutorial"))
+    return comps
+
+
+class Catalogue:
+    def __init__(self, groups_per_subject=4, tutorials_per_group=2, full_groups=()):
+        self.groups_per_subject = groups_per_subject
+        self.tutorials_per_group = tutorials_per_group
+        # Entries are "CODE/GROUP" or just "GROUP" (full in every subject)
+        self.full_groups = set(full_groups)
+
+    def groups(self, code):
+        return [group_code(i) for i in range(self.groups_per_subject)]
+
+    def components(self, code, group):
+        index = self.groups(code).index(group)
+        return components_for(index, self.tutorials_per_group)
+
+    def group_for_value(self, code, value):
+        for g in self.groups(code):
+            if option_value(code, g) == value:
+                return g
+        return None
+
+    def is_full(self, code, group):
+        return f"{code}/{group}" in self.full_groups or group in self.full_groups
+
+
+# ==========================================
+# 2. Server State
+# ==========================================
+class StudentSession:
+    def __init__(self, user, views_in_session):
+        self.user = user
+        self.views = OrderedDict()  # ViewState token -> (view name, context)
+        self.views_in_session = views_in_session
+        self.last_seen = time.monotonic()
+        self.cart = []
+        self.registered = []
+        self.messages = []
+
+    def new_view(self, name, context, token):
+        self.views[token] = (name, context)
+        while len(self.views) > self.views_in_session:
+            self.views.popitem(last=False)
+        return token
+
+    def restore(self, token):
+        return self.views.get(token)
+
+
+class FakeEStudent:
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, jitter=0.0,
+                 pad_kb=0, viewstate_bytes=0, password=None, session_ttl=1800,
+                 views_in_session=15, catalogue=None, clock_offset=0.0, seed=None):
+        self.host, self.port = host, port
+        self.latency, self.jitter = latency, jitter
+        self.pad_kb = pad_kb
+        self.viewstate_bytes = viewstate_bytes
+        self.password = password
+        self.session_ttl = session_ttl
+        self.views_in_session = views_in_session
+        self.catalogue = catalogue or Catalogue()
+        self.clock_offset = clock_offset  # server clock minus real time, in s
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.sessions = {}
+        self.saml_tokens = {}
+        self.request_log = []
+        self.httpd = None
+        self.thread = None
+        self._padding = None
+
+    # ---- lifecycle ----
+    def start(self):
+        handler = type("Handler", (_Handler,), {"app": self})
+        self.httpd = ThreadingHTTPServer((self.host, self.port), handler)
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        self.thread = threading.Thread(
+            target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        if self.httpd:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @property
+    def origin(self):
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def base_url(self):
+        return self.origin + ESTUDENT
+
+    # ---- helpers ----
+    def delay(self):
+        d = self.latency + (self.random.uniform(0, self.jitter)
+                            if self.jitter else 0.0)
+        if d > 0:
+            time.sleep(d)
+
+    def make_view_state(self):
+        if self.viewstate_bytes:
+            # Client-side state saving: a large opaque base64 blob
+            return base64.b64encode(os.urandom(self.viewstate_bytes)).decode()
+        return f"{self.random.randrange(-2**63, 2**63)}:{self.random.randrange(-2**63, 2**63)}"
+
+    def session_for(self, cookies):
+        sid = cookies.get("JSESSIONID")
+        with self.lock:
+            sess = self.sessions.get(sid)
+            if not sess:
+                return None
+            if time.monotonic() - sess.last_seen > self.session_ttl:
+                del self.sessions[sid]
+                return None
+            sess.last_seen = time.monotonic()
+            return sess
+
+    def expire_sessions(self):
+        with self.lock:
+            self.sessions.clear()
+
+    def registered(self):
+        with self.lock:
+            return {s.user: list(s.registered) for s in self.sessions.values()}
+
+    def padding(self):
+        if not self.pad_kb:
+            return ""
+        if self._padding is None:
+            self._padding = self._build_padding()
+        return self._padding
+
+    def _build_padding(self):
+        item = '<li class="menu-item"><a href="#">Student Services Menu Entry {}</a></li>\n'
+        out, size, n = [], 0, 0
+        while size < self.pad_kb * 1024:
+            line = item.format(n)
+            out.append(line)
+            size += len(line)
+            n += 1
+        return '<ul class="nav">\n' + "".join(out) + "</ul>\n"
+
+    def page(self, title, body, view_state=None):
+        vs = ""
+        if view_state is not None:
+            vs = (f'<input type="hidden" name="javax.faces.ViewState" '
+                  f'id="j_id1:javax.faces.ViewState:0" value="{html.escape(view_state)}" '
+                  f'autocomplete="off" />\n')
+        return (
+            "<!DOCTYPE html>\n<html><head>"
+            '<meta http-equiv="Content-Type" content="text/html; charset=UTF-8" />'
+            f"<title>{title}</title></head>\n<body>\n"
+            f'<div id="header">eStudent'
+            f'<form id="headerForm" method="post" action="">'
+            f'<input type="submit" name="headerForm:logout" value="Logout" /></form></div>\n'
+            f"{self.padding()}"
+            f'<form id="mainForm" name="mainForm" method="post" '
+            f'action="" enctype="application/x-www-form-urlencoded">\n'
+            f'<input type="hidden" name="mainForm" value="mainForm" />\n'
+            f"{body}\n{vs}</form>\n</body></html>\n"
+        )
+
+
+# ==========================================
+# 3. Request Handler
+# ==========================================
+class _Handler(BaseHTTPRequestHandler):
+    app = None
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def date_time_string(self, timestamp=None):
+        if timestamp is None:
+            timestamp = time.time() + self.app.clock_offset
+        return super().date_time_string(timestamp)
+
+    # ---- plumbing ----
+    def cookies(self):
+        out = {}
+        for part in self.headers.get("Cookie", "").split(";"):
+            if "=" in part:
+                k, v = part.strip().split("=", 1)
+                out[k] = v
+        return out
+
+    def form(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length).decode("utf-8") if length else ""
+        return {k: v[-1] for k, v in parse_qs(body, keep_blank_values=True).items()}
+
+    def send(self, status, body="", headers=()):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        if data:
+            self.send_header("Content-Type", "text/html;charset=UTF-8")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in headers:
+            self.send_header(k, v)
+        self.end_headers()
+        if data and self.command != "HEAD":
+            self.wfile.write(data)
+
+    def redirect(self, location, headers=()):
+        self.send(302, headers=[("Location", location)] + list(headers))
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def do_GET(self):
+        self.dispatch("GET")
+
+    def do_POST(self):
+        self.dispatch("POST")
+
+    def dispatch(self, method):
+        app = self.app
+        app.delay()
+        url = urlsplit(self.path)
+        with app.lock:
+            app.request_log.append((method, url.path))
+        form = self.form() if method == "POST" else {}
+        if url.path == SAML_CALLBACK:
+            return self.saml_callback(method, form)
+        if url.path == ADFS:
+            return self.adfs(method, url.query, form)
+        if url.path.startswith(ESTUDENT + "secure/"):
+            sess = app.session_for(self.cookies())
+            if not sess:
+                return self.redirect(SAML_CALLBACK + "?eStudver=2")
+            return self.secure(method, url.path, form, sess)
+        self.send(404, "<html><body>Not Found</body></html>")
+
+    # ---- ADFS / SAML ----
+    def saml_callback(self, method, form):
+        app = self.app
+        if method == "GET":
+            relay = secrets.token_urlsafe(8)
+            return self.redirect(f"{ADFS}?SAMLRequest={secrets.token_urlsafe(48)}&RelayState={relay}")
+        with app.lock:
+            user = app.saml_tokens.pop(form.get("SAMLResponse"), None)
+        if not user:
+            return self.send(403, "<html><body>Invalid SAML assertion</body></html>")
+        sid = secrets.token_hex(16).upper()
+        with app.lock:
+            app.sessions[sid] = StudentSession(user, app.views_in_session)
+        self.redirect(HOME, [("Set-Cookie", f"JSESSIONID={sid}; Path=/eStudent; HttpOnly")])
+
+    def login_form(self, query, error=""):
+        err = f'<span id="errorText" class="fieldMargin error">{error}</span>' if error else ""
+        body = (
+            f"<!DOCTYPE html>\n<html><head><title>Sign In</title></head><body>\n"
+            f'<form method="post" id="loginForm" autocomplete="off" action="{ADFS}?{html.escape(query)}">\n'
+            f"{err}\n"
+            '<input id="userNameInput" name="UserName" type="email" value="" />\n'
+            '<input id="passwordInput" name="Password" type="password" />\n'
+            '<input id="kmsiInput" type="checkbox" name="Kmsi" />\n'
+            '<input id="optionForms" type="hidden" name="AuthMethod" value="FormsAuthentication" />\n'
+            '<span id="submitButton" class="submit" role="button">Sign in</span>\n'
+            "</form></body></html>\n"
+        )
+        self.send(200, body)
+
+    def adfs(self, method, query, form):
+        app = self.app
+        if method == "GET":
+            return self.login_form(query)
+        user = form.get("UserName", "")
+        password = form.get("Password", "")
+        ok = user.startswith("hh\\") and password and (
+            app.password is None or password == app.password)
+        if not ok:
+            return self.login_form(query, "Incorrect user ID or password.")
+        token = base64.b64encode(os.urandom(3000)).decode()
+        with app.lock:
+            app.saml_tokens[token] = user[3:]
+        body = (
+            "<html><head><title>Working...</title></head>"
+            '<body onload="document.forms[0].submit()">\n'
+            f'<form method="POST" name="hiddenform" action="{app.origin}{SAML_CALLBACK}">\n'
+            f'<input type="hidden" name="SAMLResponse" value="{token}" />\n'
+            f'<input type="hidden" name="RelayState" value="{secrets.token_urlsafe(8)}" />\n'
+            "<noscript><p>Script is disabled. Click Submit to continue.</p>"
+            '<input type="submit" value="Submit" /></noscript>\n'
+            "</form></body></html>\n"
+        )
+        self.send(200, body, [("Set-Cookie", "MSISAuth=" + secrets.token_hex(24) + "; Path=/adfs; HttpOnly")])
+
+    # ---- eStudent JSF pages ----
+    def view_expired(self):
+        self.send(500, "<html><body><h1>javax.faces.application.ViewExpiredException</h1>"
+                       "<p>View could not be restored.</p></body></html>")
+
+    def render(self, sess, name, context=None):
+        app = self.app
+        context = context or {}
+        vs = sess.new_view(name, context, app.make_view_state())
+        body = getattr(self, "body_" + name)(sess, context)
+        messages = "".join(
+            f'<li class="error">{html.escape(m)}</li>' for m in sess.messages)
+        sess.messages = []
+        if messages:
+            body = f'<ul id="messages">{messages}</ul>\n' + body
+        self.send(200, app.page("eStudent - Subject Registration", body, vs))
+
+    def secure(self, method, path, form, sess):
+        if path == HOME:
+            return self.send(200, self.app.page("eStudent - Home", "<h1>Welcome</h1>"))
+        if method == "GET":
+            if path == ACAD_YEAR_SEM:
+                return self.render(sess, "acad_year_sem")
+            if path == SELECT_SUBJECT:
+                return self.render(sess, "subject")
+            return self.send(404, "<html><body>Not Found</body></html>")
+
+        restored = sess.restore(form.get("javax.faces.ViewState"))
+        if not restored:
+            return self.view_expired()
+        view, context = restored
+        if path == ACAD_YEAR_SEM and view == "acad_year_sem" and "mainForm:nextButton" in form:
+            return self.redirect(SELECT_SUBJECT)
+        if path == SELECT_SUBJECT and view in ("subject", "search"):
+            return self.subject_action(sess, view, context, form)
+        if path == SELECT_COMPONENT and view == "component":
+            return self.component_action(sess, context, form)
+        if path == PREVIEW and view == "preview" and form.get("mainForm:confirmButton") == "Confirm":
+            sess.registered.extend(sess.cart)
+            sess.cart = []
+            return self.send(200, self.app.page(
+                "eStudent - Subject Registration",
+                '<div class="success">Subject registration has been submitted successfully. 登記成功</div>'))
+        self.view_expired()
+
+    def subject_action(self, sess, view, context, form):
+        cat = self.app.catalogue
+        if form.get("mainForm:basicSearchButton"):
+            code = form.get("mainForm:basicSearchSubjectCode", "").strip().upper()
+            return self.render(sess, "search", {"code": code})
+        add = "mainForm:basicSearchTable:0:basicSearchAddSubjectButton_"
+        if view == "search" and add in form:
+            code = context.get("code")
+            value = form.get(
+                "mainForm:basicSearchTable:0:basicSearchSubjectGroup_", "")
+            group = cat.group_for_value(code, value)
+            if not group:
+                sess.messages.append("Please select a subject group.")
+                return self.render(sess, "search", context)
+            return self.render(sess, "component", {"code": code, "group": group, "value": value})
+        if form.get("mainForm:confirmButton") == "Proceed to Preview":
+            if not sess.cart:
+                sess.messages.append("Your shopping cart is empty.")
+                return self.render(sess, "subject")
+            return self.render(sess, "preview")
+        self.view_expired()
+
+    def component_action(self, sess, context, form):
+        cat = self.app.catalogue
+        code, group = context["code"], context["group"]
+        if form.get("mainForm:selectCompSubjectGroup") != context["value"]:
+            return self.view_expired()
+        comps = cat.components(code, group)
+        picked = [comps[i][0] for i in range(len(comps))
+                  if form.get(f"mainForm:ComponentTable:{i}:selectCompSelected_") == "on"]
+        if not picked:
+            sess.messages.append("Please select at least one component.")
+            return self.render(sess, "component", context)
+        if cat.is_full(code, group):
+            sess.messages.append(
+                f"{code} group {group}: the subject group is full.")
+            return self.render(sess, "subject")
+        sess.cart.append((code, group, picked))
+        return self.render(sess, "subject")
+
+    # ---- page bodies ----
+    def body_acad_year_sem(self, sess, context):
+        return ('<select id="mainForm:acadYearSem" name="mainForm:acadYearSem">'
+                '<option value="2026-1" selected="selected">2026/27 Semester 1</option>'
+                '<option value="2026-2">2026/27 Semester 2</option></select>\n'
+                '<input type="submit" name="mainForm:nextButton" value="Go" />')
+
+    def body_subject(self, sess, context):
+        rows = "".join(
+            f"<tr><td>{c}</td><td>{g}</td><td>{', '.join(p)}</td></tr>" for c, g, p in sess.cart)
+        return (
+            '<input id="mainForm:basicSearchSubjectCode" name="mainForm:basicSearchSubjectCode" type="text" value="" />\n'
+            '<input type="submit" name="mainForm:basicSearchButton" value="Search" />\n'
+            f'<table id="mainForm:cartTable"><tbody>{rows}</tbody></table>\n'
+            '<input type="submit" name="mainForm:confirmButton" value="Proceed to Preview" />'
+        )
+
+    def body_search(self, sess, context):
+        cat = self.app.catalogue
+        code = context["code"]
+        options = "".join(
+            f'<option value="{option_value(code, g)}">{g}</option>' for g in cat.groups(code))
+        return self.body_subject(sess, context) + (
+            '\n<table id="mainForm:basicSearchTable"><thead><tr><th>Subject Code</th>'
+            "<th>Subject Title</th><th>Group</th><th></th></tr></thead><tbody>\n"
+            f"<tr><td>{code}</td><td>Subject {code}</td><td>"
+            '<select id="mainForm:basicSearchTable:0:basicSearchSubjectGroup_" '
+            'name="mainForm:basicSearchTable:0:basicSearchSubjectGroup_" size="1">'
+            f'<option value="">-- Select --</option>{options}</select></td>'
+            '<td><input type="submit" name="mainForm:basicSearchTable:0:basicSearchAddSubjectButton_" '
+            'value="+" /></td></tr>\n</tbody></table>'
+        )
+
+    def body_component(self, sess, context):
+        cat = self.app.catalogue
+        rows = []
+        for i, (comp, kind) in enumerate(cat.components(context["code"], context["group"])):
+            cid = f"mainForm:ComponentTable:{i}:selectCompSelected_"
+            rows.append(
+                f'<tr><td><input id="{cid}" type="checkbox" name="{cid}" /></td>'
+                f"<td>{comp}</td><td>{kind}</td><td>{DAYS[i % 5]} {8 + i:02d}:30-{10 + i:02d}:20</td>"
+                f"<td>Y{301 + i}</td></tr>\n")
+        return (
+            f'<input type="hidden" name="mainForm:selectCompSubjectGroup" value="{context["value"]}" />\n'
+            f'<h2>{context["code"]} Group {context["group"]}</h2>\n'
+            '<table id="mainForm:ComponentTable"><thead><tr><th></th><th>Component</th>'
+            "<th>Type</th><th>Day/Time</th><th>Venue</th></tr></thead><tbody>\n"
+            f'{"".join(rows)}</tbody></table>\n'
+            '<input type="submit" name="mainForm:selectButton" value="Add to Cart" />'
+        )
+
+    def body_preview(self, sess, context):
+        rows = "".join(
+            f"<tr><td>{c}</td><td>{g}</td><td>{', '.join(p)}</td></tr>" for c, g, p in sess.cart)
+        return (f'<table id="mainForm:previewTable"><tbody>{rows}</tbody></table>\n'
+                '<input type="submit" name="mainForm:confirmButton" value="Confirm" />')
+
+
+def main():
+    ap = argparse.ArgumentParser(
+        description="Run a local stand-in for ADFS and the eStudent registration pages.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8080)
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    ap.add_argument("--jitter-ms", type=float, default=0.0)
+    ap.add_argument("--pad-kb", type=int, default=0,
+                    help="extra markup per page, to mimic eStudent's page weight")
+    ap.add_argument("--viewstate-bytes", type=int, default=0,
+                    help="use client-side style ViewState blobs of this size")
+    ap.add_argument("--clock-offset-ms", type=float, default=0.0,
+                    help="skew the Date header by this much")
+    ap.add_argument("--groups", type=int, default=4)
+    ap.add_argument("--full", action="append", default=[],
+                    help="mark GROUP or CODE/GROUP as full (repeatable)")
+    args = ap.parse_args()
+
+    server = FakeEStudent(args.host, args.port, args.latency_ms / 1000, args.jitter_ms / 1000,
+                          args.pad_kb, args.viewstate_bytes,
+                          catalogue=Catalogue(args.groups, full_groups=args.full),
+                          clock_offset=args.clock_offset_ms / 1000)
+    server.start()
+    print(f"Fake eStudent running at {server.base_url} (Ctrl+C to stop)")
+    try:
+        server.thread.join()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# Opt-in capture of the pages seen during a real run, for offline parser
+# benchmarks (bench/bench_replay.py).
+#
+# Every response body is kept as it arrived, minus credentials and personal
+# data, in a zip bundle with a manifest of which step fetched it. Redaction
+# overwrites with the same number of characters, so page sizes and the
+# positions the scanners have to skip over stay realistic.
+#
+# Names cannot be told from other page text, so only the ones passed in
+# (reg_cli.py --redact) are blanked. Other personal details eStudent might
+# show (address, phone, date of birth) are not; check a bundle before
+# sharing it.
+import html
+import json
+import re
+import zipfile
+from datetime import datetime
+from urllib.parse import quote
+
+REDACT_CHAR = "x"
+# SAML assertions, login form values, student numbers and e-mail addresses
+SENSITIVE = [
+    re.compile(r'name="(?:SAMLResponse|RelayState|UserName|Password)"[^>]*?value="([^"]*)"', re.I),
+    re.compile(r'value="([^"]*)"[^>]*?name="(?:SAMLResponse|RelayState|UserName|Password)"', re.I),
+    re.compile(r"\b(\d{8}[A-Za-z])\b"),
+    re.compile(r"([\w.+-]+@[\w-]+(?:\.[\w-]+)+)"),
+]
+
+
+def name_pattern(name):
+    # Either word order ("CHAN Tai Man" / "Tai Man CHAN"), any spacing or
+    # commas between the words, as text or HTML-escaped
+    words = re.findall(r"[^\s,]+", name)
+    if not words:
+        return None
+    sep = r"(?:[\s,]|&nbsp;)+"
+    orders = {tuple(words), tuple(words[1:] + words[:1]), tuple(words[-1:] + words[:-1])}
+    alts = [sep.join(f"(?:{re.escape(w)}|{re.escape(html.escape(w))})" for w in order)
+            for order in orders]
+    return re.compile(r"(?<!\w)(?:" + "|".join(alts) + r")(?!\w)", re.I)
+
+
+def _blank(match):
+    start, end = match.span(1)
+    whole = match.group(0)
+    offset = match.start(0)
+    return whole[:start - offset] + REDACT_CHAR * (end - start) + whole[end - offset:]
+
+
+class PageRecorder:
+    def __init__(self, trace, secrets=(), names=()):
+        self.trace = trace
+        self.secrets = []
+        for s in secrets:
+            if s:
+                self.secrets.extend({s, quote(s, safe=""), s.replace("\\", "\\\\")})
+        self.names = [p for p in map(name_pattern, names) if p]
+        self.responses = []
+
+    def observe(self, res, *args, **kwargs):
+        # Response hook; streamed bodies are read by the bot before saving
+        step = self.trace.current["step"] if self.trace.current else None
+        self.responses.append((step, res))
+
+    def redact(self, text):
+        for secret in self.secrets:
+            text = re.sub(re.escape(secret), REDACT_CHAR * len(secret), text, flags=re.I)
+        for pattern in self.names:
+            text = pattern.sub(lambda m: REDACT_CHAR * len(m.group(0)), text)
+        for pattern in SENSITIVE:
+            text = pattern.sub(_blank, text)
+        return text
+
+    def save(self, path, meta):
+        pages = []
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as bundle:
+            for i, (step, res) in enumerate(self.responses):
+                try:
+                    body = res.content
+                except Exception:
+                    continue
+                if not body:
+                    continue
+                text = self.redact(body.decode(res.encoding or "utf-8", errors="replace"))
+                name = f"pages/{i:03d}.html"
+                bundle.writestr(name, text.encode("utf-8"))
+                pages.append({"file": name, "step": step, "method": res.request.method,
+                              "url": self.redact(res.url.split("?")[0]),
+                              "status": res.status_code, "bytes": len(body)})
+            manifest = dict(meta, created_at=datetime.now().isoformat(timespec="seconds"),
+                            pages=pages)
+            bundle.writestr("manifest.json", json.dumps(manifest, ensure_ascii=False, indent=2))
+        return len(pages)
+
+
+def load_bundle(path):
+    with zipfile.ZipFile(path) as bundle:
+        manifest = json.loads(bundle.read("manifest.json"))
+        pages = [(p, bundle.read(p["file"]).decode("utf-8")) for p in manifest["pages"]]
+    return manifest, pages
@@ -0,0 +1,135 @@
+# Light helpers shared by the GUI, the CLI and the registration core: the
+# data files kept under the data directory and the app logger. Standard
+# library only, so the GUI can show its window before the network stack
+# is imported.
+import csv
+import json
+import logging
+import os
+from datetime import datetime
+from pathlib import Path
+
+APP_VERSION = "1.1.0"
+
+
+# ==========================================
+# 0. Persistence Helpers (Save/Load)
+# ==========================================
+def get_data_dir():
+    appdata = os.getenv("APPDATA")
+    if appdata:
+        path = Path(appdata) / "PolyURegBot"
+    else:
+        path = Path.home() / ".polyu_reg_bot"
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def get_courses_path():
+    return get_data_dir() / "courses.json"
+
+
+def get_traces_dir():
+    return get_data_dir() / "traces"
+
+
+def get_captures_dir():
+    return get_data_dir() / "captures"
+
+
+def get_history_path():
+    return get_data_dir() / "history.jsonl"
+
+
+def get_session_cache_path():
+    return get_data_dir() / "session.cache"
+
+
+def get_plan_path():
+    return get_data_dir() / "plan.json"
+
+
+def plan_key(code, group, comps):
+    return f"{code.upper()}|{group}|{','.join(comps)}"
+
+
+def load_plan():
+    path = get_plan_path()
+    if not path.exists():
+        return {}
+    try:
+        entries = json.loads(path.read_text(encoding="utf-8"))["subjects"]
+        return {e.get("key") or plan_key(e["code"], e["group"], e["components"]): e
+                for e in entries}
+    except Exception:
+        return {}
+
+
+def save_plan(entries):
+    path = get_plan_path()
+    try:
+        path.write_text(json.dumps({"created_at": datetime.now().isoformat(timespec="seconds"),
+                                    "subjects": entries}, ensure_ascii=False, indent=2),
+                        encoding="utf-8")
+    except Exception as e:
+        print(f"Save failed: {e}")
+
+
+def subjects_from_courses(courses):
+    # Same rows the GUI table would submit: code and group are required
+    subjects = []
+    for item in courses or []:
+        c, g = item.get("code", "").strip(), item.get("group", "").strip()
+        if c and g:
+            subjects.append([c.upper(), g, [x.strip() for x in item.get("components", [])]])
+    return subjects
+
+
+def load_courses_from_file():
+    path = get_courses_path()
+    if not path.exists():
+        return None
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except Exception:
+        return None
+
+
+def save_courses_to_file(courses):
+    path = get_courses_path()
+    try:
+        path.write_text(json.dumps(courses, ensure_ascii=False,
+                        indent=2), encoding="utf-8")
+    except Exception as e:
+        print(f"Save failed: {e}")
+
+
+def load_courses_csv(path):
+    # One subject per line: code, group, components. Components may be one
+    # quoted cell or spread over the remaining cells; a header is skipped.
+    courses = []
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        for row in csv.reader(f):
+            cells = [c.strip() for c in row] + ["", ""]
+            if not any(cells) or cells[0].lower() == "code":
+                continue
+            comps = [x.strip() for x in ",".join(cells[2:]).split(",") if x.strip()]
+            courses.append({"code": cells[0], "group": cells[1], "components": comps})
+    return courses
+
+
+def save_courses_csv(path, courses):
+    # utf-8-sig so that Excel opens it correctly
+    with open(path, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.writer(f)
+        writer.writerow(["code", "group", "components"])
+        for item in courses:
+            writer.writerow([item["code"], item["group"], ",".join(item["components"])])
+
+
+# ==========================================
+# 1. Logging
+# ==========================================
+logger = logging.getLogger("PolyURegBot")
+logger.setLevel(logging.INFO)
+formatter = logging.Formatter('%(asctime)s - %(message)s')
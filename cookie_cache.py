@@ -0,0 +1,128 @@
+# Encrypted on-disk cache of the eStudent/ADFS session cookies, so a run
+# started shortly after another one can skip the SAML login.
+#
+# Encryption uses Fernet (from the optional "cryptography" package) with a
+# key derived from the account password, or DPAPI on Windows when that is
+# not installed. With neither available the cache is disabled; cookies are
+# never written in the clear.
+import base64
+import hashlib
+import json
+import os
+import sys
+import time
+
+from requests.cookies import create_cookie
+
+KDF_ITERATIONS = 100_000
+# eStudent sessions do not outlive this anyway
+MAX_AGE = 8 * 3600
+
+
+def _fernet(password, salt):
+    from cryptography.fernet import Fernet
+    key = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, KDF_ITERATIONS)
+    return Fernet(base64.urlsafe_b64encode(key))
+
+
+def _dpapi(data, entropy, protect):
+    import ctypes
+    from ctypes import wintypes
+
+    class Blob(ctypes.Structure):
+        _fields_ = [("cbData", wintypes.DWORD), ("pbData", ctypes.POINTER(ctypes.c_char))]
+
+    def blob(b):
+        return Blob(len(b), ctypes.cast(ctypes.create_string_buffer(b, len(b)),
+                                        ctypes.POINTER(ctypes.c_char)))
+
+    crypt32, kernel32 = ctypes.windll.crypt32, ctypes.windll.kernel32
+    out = Blob()
+    fn = crypt32.CryptProtectData if protect else crypt32.CryptUnprotectData
+    if not fn(ctypes.byref(blob(data)), None, ctypes.byref(blob(entropy)),
+              None, None, 0, ctypes.byref(out)):
+        raise OSError("DPAPI call failed")
+    try:
+        return ctypes.string_at(out.pbData, out.cbData)
+    finally:
+        kernel32.LocalFree(out.pbData)
+
+
+def available_scheme():
+    try:
+        import cryptography.fernet  # noqa: F401
+        return "fernet"
+    except ImportError:
+        pass
+    if sys.platform == "win32":
+        return "dpapi"
+    return None
+
+
+class CookieCache:
+    def __init__(self, path, user_id, password):
+        self.path = path
+        self.user_id = user_id
+        self.password = password
+        self.scheme = available_scheme()
+
+    @property
+    def enabled(self):
+        return self.scheme is not None
+
+    def _entropy(self):
+        return hashlib.sha256(f"{self.user_id}\0{self.password}".encode("utf-8")).digest()
+
+    def _seal(self, plain):
+        if self.scheme == "fernet":
+            salt = os.urandom(16)
+            token = _fernet(self.password, salt).encrypt(plain)
+        else:
+            salt = b""
+            token = _dpapi(plain, self._entropy(), protect=True)
+        return {"scheme": self.scheme, "salt": base64.b64encode(salt).decode(),
+                "token": base64.b64encode(token).decode()}
+
+    def _open(self, sealed):
+        if sealed["scheme"] != self.scheme:
+            return None
+        token = base64.b64decode(sealed["token"])
+        if self.scheme == "fernet":
+            return _fernet(self.password, base64.b64decode(sealed["salt"])).decrypt(token)
+        return _dpapi(token, self._entropy(), protect=False)
+
+    def save(self, session, base_url):
+        if not self.enabled:
+            return False
+        cookies = [{"name": c.name, "value": c.value, "domain": c.domain, "path": c.path,
+                    "secure": c.secure, "expires": c.expires, "rest": c._rest}
+                   for c in session.cookies]
+        plain = json.dumps({"user_id": self.user_id, "base_url": base_url,
+                            "saved_at": time.time(), "cookies": cookies}).encode("utf-8")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self._seal(plain)), encoding="utf-8")
+        os.replace(tmp, self.path)
+        return True
+
+    def load(self, session, base_url):
+        # Restores the cached cookies into the session; True if there were any
+        if not self.enabled or not self.path.exists():
+            return False
+        try:
+            data = json.loads(self._open(json.loads(self.path.read_text(encoding="utf-8"))))
+        except Exception:
+            # Wrong password, other Windows user or a damaged file
+            return False
+        if (data["user_id"] != self.user_id or data["base_url"] != base_url
+                or time.time() - data["saved_at"] > MAX_AGE or not data["cookies"]):
+            return False
+        for c in data["cookies"]:
+            session.cookies.set_cookie(create_cookie(**c))
+        return True
+
+    def clear(self):
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
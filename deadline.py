@@ -0,0 +1,78 @@
+# Time budgets and cancellation for a registration run.
+#
+# A Deadline holds an optional whole-run budget and the budget of the step
+# in progress (login, semester selection, one subject, finalize). The
+# transport asks it for a timeout before every request, so no request can
+# outlive either budget, and a cancelled run fails at the next request.
+import threading
+import time
+from contextlib import contextmanager
+
+CONNECT_TIMEOUT = 10.0
+DEFAULT_TIMEOUT = 30.0
+
+
+class Cancelled(Exception):
+    def __init__(self):
+        super().__init__("Run cancelled.")
+
+
+class BudgetExceeded(Exception):
+    pass
+
+
+class Deadline:
+    def __init__(self, abort_event=None):
+        self.abort_event = abort_event or threading.Event()
+        self.run_seconds = None
+        self.run_end = None
+        self.step_name = None
+        self.step_seconds = None
+        self.step_end = None
+        # Set when a step ends with a budget used up; cleared on the next step
+        self.exceeded = None
+
+    def start_run(self, seconds):
+        self.run_seconds = seconds
+        self.run_end = time.perf_counter() + seconds if seconds else None
+
+    @property
+    def cancelled(self):
+        return self.abort_event.is_set()
+
+    def run_expired(self):
+        return self.run_end is not None and time.perf_counter() >= self.run_end
+
+    def remaining(self):
+        now = time.perf_counter()
+        ends = [e for e in (self.step_end, self.run_end) if e is not None]
+        return min(ends) - now if ends else None
+
+    def describe(self):
+        # Which budget is (or was) the binding one
+        if self.run_expired():
+            return f"Run budget of {self.run_seconds:g} s used up during '{self.step_name}'."
+        return f"Step '{self.step_name}' used up its {self.step_seconds:g} s budget."
+
+    def timeout(self):
+        if self.cancelled:
+            raise Cancelled()
+        left = self.remaining()
+        if left is None:
+            return (CONNECT_TIMEOUT, DEFAULT_TIMEOUT)
+        if left <= 0:
+            raise BudgetExceeded(self.describe())
+        return (min(left, CONNECT_TIMEOUT), left)
+
+    @contextmanager
+    def step(self, name, seconds):
+        self.step_name, self.step_seconds = name, seconds
+        self.step_end = time.perf_counter() + seconds if seconds else None
+        self.exceeded = None
+        try:
+            yield
+        finally:
+            left = self.remaining()
+            if left is not None and left <= 0 and not self.cancelled:
+                self.exceeded = self.describe()
+            self.step_end = None
@@ -0,0 +1,108 @@
+# Run history: one JSON line per finished run with its time and response
+# size per phase, the outcome per subject and the app version, so a run
+# can be compared with the best and median of earlier runs of the same kind.
+import json
+import statistics
+from datetime import datetime
+
+PHASES = ("login", "semester", "subjects", "finalize")
+# Flag a phase when it is this much slower than the median of earlier runs
+SLOWER_RATIO = 1.2
+SLOWER_MIN_MS = 20.0
+
+
+def phase_of(step):
+    if step.startswith("login"):
+        return "login"
+    if step.startswith("semester"):
+        return "semester"
+    if step in ("preview", "confirm"):
+        return "finalize"
+    if ": " in step and not step.startswith("("):
+        return "subjects"
+    # prewarm, session checks and markers are not part of the run itself
+    return None
+
+
+def summarize_run(trace, version, mode, ok, message, results):
+    phases, sizes, per_subject = {}, {}, {}
+    for s in trace["steps"]:
+        phase = phase_of(s["step"])
+        if phase is None:
+            continue
+        ms = s["duration_ms"] or 0.0
+        phases[phase] = phases.get(phase, 0.0) + ms
+        sizes[phase] = sizes.get(phase, 0) + sum(r["bytes"] or 0 for r in s["requests"])
+        if phase == "subjects":
+            code = s["step"].split(": ")[0]
+            per_subject[code] = per_subject.get(code, 0.0) + ms
+    return {
+        "version": version,
+        "started_at": datetime.fromtimestamp(trace["started_at"]).isoformat(timespec="seconds"),
+        "mode": mode,
+        "ok": ok,
+        "message": message,
+        "total_ms": round(sum(phases.values()), 1),
+        "phases_ms": {k: round(v, 1) for k, v in phases.items()},
+        "bytes": sum(sizes.values()),
+        "subjects": [dict(r, ms=round(per_subject.get(r["code"], 0.0), 1)) for r in results],
+    }
+
+
+def append_run(path, entry):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+def load_runs(path):
+    if not path.exists():
+        return []
+    runs = []
+    for line in path.read_text(encoding="utf-8").splitlines():
+        try:
+            runs.append(json.loads(line))
+        except ValueError:
+            continue
+    return runs
+
+
+def _metrics(entry):
+    out = {p: entry["phases_ms"][p] for p in PHASES if p in entry["phases_ms"]}
+    out["total"] = entry["total_ms"]
+    return out
+
+
+def compare(entry, previous):
+    # Only successful earlier runs of the same mode are a fair baseline
+    baseline = [r for r in previous if r["ok"] and r["mode"] == entry["mode"]]
+    if not baseline:
+        return [f"No earlier successful '{entry['mode']}' runs to compare with."]
+    lines = [f"Compared with {len(baseline)} earlier '{entry['mode']}' runs "
+             f"(this run: v{entry['version']}):",
+             f"{'phase':<10}{'this':>9}{'best':>9}{'median':>9}{'vs median':>11}"]
+    for name, ms in _metrics(entry).items():
+        values = [_metrics(r)[name] for r in baseline if name in _metrics(r)]
+        if not values:
+            continue
+        best, median = min(values), statistics.median(values)
+        delta = (ms - median) / median * 100 if median else 0.0
+        slower = ms > median * SLOWER_RATIO and ms - median > SLOWER_MIN_MS
+        lines.append(f"{name:<10}{ms:>9.0f}{best:>9.0f}{median:>9.0f}{delta:>+10.0f}%"
+                     + ("  <-- slower" if slower else ""))
+    kb = statistics.median(r["bytes"] for r in baseline) / 1024
+    lines.append(f"{'KB':<10}{entry['bytes'] / 1024:>9.0f}{'':>9}{kb:>9.0f}")
+    return lines
+
+
+def report(runs, last=10):
+    if not runs:
+        return ["No runs recorded yet."]
+    lines = [f"{'started':<21}{'version':<10}{'mode':<11}{'ok':<5}{'total ms':>9}  subjects"]
+    for r in (runs[-last:] if last > 0 else []):
+        added = sum(s["added"] or s.get("planned", False) for s in r["subjects"])
+        lines.append(f"{r['started_at']:<21}{r['version']:<10}{r['mode']:<11}"
+                     f"{'yes' if r['ok'] else 'no':<5}{r['total_ms']:>9.0f}  "
+                     f"{added}/{len(r['subjects'])}")
+    lines.append("")
+    return lines + compare(runs[-1], runs[:-1])
@@ -0,0 +1,551 @@
+# Field extraction for the eStudent/ADFS pages.
+#
+# The bot only ever needs a handful of things from each response: the JSF
+# ViewState, the subject group <select>, the component checkbox rows and the
+# inputs of a login form. Building a full BeautifulSoup tree for that is the
+# main CPU cost on the critical path, so the extractors here pull just those
+# fields. "scan" is a targeted stdlib scanner that can work on a response
+# while it is still downloading; "lxml" is used if installed; "soup" is the
+# original BeautifulSoup path, kept as fallback and reference.
+#
+# Bodies are decoded with the declared charset (or UTF-8), never through
+# res.text and its charset detection, and the ViewState is found in the
+# raw bytes without decoding the page at all.
+import codecs
+import html
+import logging
+import re
+import time
+from functools import lru_cache
+
+logger = logging.getLogger("PolyURegBot")
+
+VIEW_STATE = "view_state"
+GROUP_OPTIONS = "group_options"
+COMPONENT_ROWS = "component_rows"
+
+VIEW_STATE_NAME = "javax.faces.ViewState"
+GROUP_SELECT_ID = "basicSearchSubjectGroup_"
+COMPONENT_CHECKBOX_ID = "selectCompSelected_"
+# Component rows come back as (checkbox id, cell texts joined by CELL_SEP)
+CELL_SEP = "\t"
+CHUNK_SIZE = 16 * 1024
+DEFAULT_ENCODING = "utf-8"
+META_SNIFF_BYTES = 2048
+CHARSET_RE = re.compile(r"""charset=["']?([\w.:-]+)""", re.I)
+META_CHARSET_RE = re.compile(rb"""<meta\b[^>]*charset=["']?([\w.:-]+)""", re.I)
+
+
+# ==========================================
+# 0. Encoding
+# ==========================================
+@lru_cache(maxsize=None)
+def known_encoding(name):
+    try:
+        return codecs.lookup(name).name
+    except LookupError:
+        return None
+
+
+@lru_cache(maxsize=None)
+def ascii_compatible(encoding):
+    # Markup bytes mean the same in the raw body, so it can be searched as is
+    try:
+        return "<>=\"' azAZ09.:_-".encode(encoding) == b"<>=\"' azAZ09.:_-"
+    except (LookupError, UnicodeError):
+        return False
+
+
+def page_encoding(res, head=b""):
+    # The charset from Content-Type, else from a <meta> in the first bytes,
+    # else UTF-8. requests would fall back to ISO-8859-1 for an undeclared
+    # text/html, or run charset detection over the whole body.
+    m = CHARSET_RE.search(res.headers.get("Content-Type", ""))
+    if m and known_encoding(m.group(1)):
+        return known_encoding(m.group(1))
+    m = META_CHARSET_RE.search(head[:META_SNIFF_BYTES])
+    if m and known_encoding(m.group(1).decode("ascii")):
+        return known_encoding(m.group(1).decode("ascii"))
+    return DEFAULT_ENCODING
+
+
+def decode_page(res):
+    content = res.content or b""
+    res.encoding = page_encoding(res, content)
+    return content.decode(res.encoding, errors="replace")
+
+
+def has_marker(content, encoding, markers):
+    # Byte search for any of the markers, ASCII ones case-insensitively;
+    # the markers are encoded instead of the page being decoded. A marker
+    # the page's charset cannot encode cannot be on the page.
+    if not ascii_compatible(encoding):
+        text = content.decode(encoding, errors="replace").lower()
+        return any(m.lower() in text for m in markers if m)
+    lowered = None
+    for m in markers:
+        if not m:
+            continue
+        if m.isascii():
+            if lowered is None:
+                lowered = content.lower()
+            if m.lower().encode() in lowered:
+                return True
+            continue
+        try:
+            needle = m.encode(encoding)
+        except UnicodeEncodeError:
+            continue
+        if needle in content:
+            return True
+    return False
+
+
+# ==========================================
+# 1. Base / BeautifulSoup
+# ==========================================
+class Extractor:
+    name = "base"
+    # CPU time spent extracting in the last extract_stream call, and the
+    # part of it that went into decoding the body
+    parse_time = 0.0
+    decode_time = 0.0
+
+    def extract(self, text, fields):
+        return {f: getattr(self, f)(text) for f in fields}
+
+    def extract_bytes(self, content, encoding, fields):
+        t0 = time.perf_counter()
+        text = content.decode(encoding, errors="replace")
+        self.decode_time = time.perf_counter() - t0
+        return self.extract(text, fields)
+
+    def extract_stream(self, res, fields):
+        content = res.content or b""
+        t0 = time.perf_counter()
+        res.encoding = page_encoding(res, content)
+        found = self.extract_bytes(content, res.encoding, fields)
+        self.parse_time = time.perf_counter() - t0
+        return found
+
+    def view_state(self, text):
+        raise NotImplementedError
+
+    def group_options(self, text):
+        raise NotImplementedError
+
+    def component_rows(self, text):
+        raise NotImplementedError
+
+    def form(self, text, form_id=None):
+        raise NotImplementedError
+
+
+class SoupExtractor(Extractor):
+    name = "soup"
+
+    def __init__(self):
+        from bs4 import BeautifulSoup
+        self.BeautifulSoup = BeautifulSoup
+
+    def extract(self, text, fields):
+        soup = self.BeautifulSoup(text, "html.parser")
+        return {f: getattr(self, "_" + f)(soup) for f in fields}
+
+    def view_state(self, text):
+        return self._view_state(self.BeautifulSoup(text, "html.parser"))
+
+    def group_options(self, text):
+        return self._group_options(self.BeautifulSoup(text, "html.parser"))
+
+    def component_rows(self, text):
+        return self._component_rows(self.BeautifulSoup(text, "html.parser"))
+
+    def form(self, text, form_id=None):
+        soup = self.BeautifulSoup(text, "html.parser")
+        form = soup.find("form", id=form_id) if form_id else soup.find("form")
+        if not form:
+            return None
+        fields = {tag.get("name"): tag.get("value", "")
+                  for tag in form.find_all("input") if tag.get("name")}
+        return form.get("action"), fields
+
+    def _view_state(self, soup):
+        vs = soup.find("input", {"name": VIEW_STATE_NAME})
+        return vs["value"] if vs else None
+
+    def _group_options(self, soup):
+        select = soup.find(
+            "select", {"id": lambda x: x and GROUP_SELECT_ID in x})
+        if not select:
+            return []
+        return [(opt.get("value"), opt.text) for opt in select.find_all("option")]
+
+    def _component_rows(self, soup):
+        rows = []
+        for chk in soup.find_all("input", {"type": "checkbox"}):
+            tr = chk.find_parent("tr")
+            cells = tr.find_all(["td", "th"], recursive=False) if tr else []
+            rows.append((chk.get("id", ""), CELL_SEP.join(c.get_text().strip() for c in cells)))
+        return rows
+
+
+# ==========================================
+# 2. lxml (optional dependency)
+# ==========================================
+class LxmlExtractor(Extractor):
+    name = "lxml"
+
+    def __init__(self):
+        import lxml.html
+        self.lxml_html = lxml.html
+
+    def _doc(self, text):
+        if text.lstrip().startswith("<?xml"):
+            text = text.encode("utf-8")
+        return self.lxml_html.fromstring(text)
+
+    def extract(self, text, fields):
+        doc = self._doc(text)
+        return {f: getattr(self, "_" + f)(doc) for f in fields}
+
+    def view_state(self, text):
+        return self._view_state(self._doc(text))
+
+    def group_options(self, text):
+        return self._group_options(self._doc(text))
+
+    def component_rows(self, text):
+        return self._component_rows(self._doc(text))
+
+    def form(self, text, form_id=None):
+        doc = self._doc(text)
+        forms = doc.xpath(f'//form[@id="{form_id}"]' if form_id else "//form")
+        if not forms:
+            return None
+        fields = {i.get("name"): i.get("value", "")
+                  for i in forms[0].iter("input") if i.get("name")}
+        return forms[0].get("action"), fields
+
+    def _view_state(self, doc):
+        found = doc.xpath(f'//input[@name="{VIEW_STATE_NAME}"]/@value')
+        return str(found[0]) if found else None
+
+    def _group_options(self, doc):
+        found = doc.xpath(f'//select[contains(@id, "{GROUP_SELECT_ID}")]')
+        if not found:
+            return []
+        return [(o.get("value"), o.text_content()) for o in found[0].iter("option")]
+
+    def _component_rows(self, doc):
+        rows = []
+        for chk in doc.xpath('//input[@type="checkbox"]'):
+            tr = chk.xpath("ancestor::tr[1]")
+            cells = [c for c in tr[0] if c.tag in ("td", "th")] if tr else []
+            rows.append((chk.get("id", ""), CELL_SEP.join(c.text_content().strip() for c in cells)))
+        return rows
+
+
+# ==========================================
+# 3. Targeted scanner (stdlib, streaming)
+# ==========================================
+ATTR_RE = re.compile(
+    r'([^\s=/>]+)(?:\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+)))?')
+TAG_RE = re.compile(r"<[^>]+>")
+INPUT_RE = re.compile(r"<input\b[^>]*>", re.I)
+TR_OPEN_RE = re.compile(r"<tr[\s>]", re.I)
+TABLE_TAG_RE = re.compile(r"<(/?)table[\s>]", re.I)
+CELL_OPEN_RE = re.compile(r"<t[dh][\s>]", re.I)
+OPTION_RE = re.compile(
+    r"<option\b([^>]*)>(.*?)(?=</option|<option\b|</select)", re.I | re.S)
+FORM_RE = re.compile(r"<form\b[^>]*>", re.I)
+
+
+def parse_attrs(tag):
+    attrs = {}
+    body = tag[1:-1].split(None, 1)
+    if len(body) < 2:
+        return attrs
+    for m in ATTR_RE.finditer(body[1]):
+        value = m.group(2)
+        if value is None:
+            value = m.group(3) if m.group(3) is not None else (m.group(4) or "")
+        attrs.setdefault(m.group(1).lower(), html.unescape(value))
+    return attrs
+
+
+def strip_tags(fragment):
+    return html.unescape(TAG_RE.sub("", fragment))
+
+
+def row_cells(row):
+    starts = [m.start() for m in CELL_OPEN_RE.finditer(row)]
+    return CELL_SEP.join(strip_tags(row[a:b]).strip()
+                         for a, b in zip(starts, starts[1:] + [len(row)]))
+
+
+def enclosing_table_end(text, pos):
+    # Start of the </table> closing the innermost table around pos, or -1
+    # while it has not arrived (or pos is in no table)
+    open_tables, level = 0, None
+    for m in TABLE_TAG_RE.finditer(text):
+        if level is None and m.start() > pos:
+            if not open_tables:
+                return -1
+            level = open_tables
+        if not m.group(1):
+            open_tables += 1
+        elif open_tables == level:
+            return m.start()
+        else:
+            open_tables = max(open_tables - 1, 0)
+    return -1
+
+
+def enclosing_tag(text, pos):
+    start = text.rfind("<", 0, pos)
+    end = text.find(">", pos)
+    if start < 0 or end < 0:
+        return None, -1
+    return text[start:end + 1], start
+
+
+class ScanExtractor(Extractor):
+    name = "scan"
+
+    # Each scanner returns its value, or None while the fragment it needs
+    # has not fully arrived yet (only relevant when streaming). A field is
+    # complete once the select or table holding it is closed; until one is
+    # seen, only the end of the page says it is absent.
+    def scan_view_state(self, text, final):
+        pos = text.find(VIEW_STATE_NAME)
+        while pos >= 0:
+            tag, _ = enclosing_tag(text, pos)
+            if tag is None:
+                return None if not final else ""
+            attrs = parse_attrs(tag)
+            if tag[:6].lower() == "<input" and attrs.get("name") == VIEW_STATE_NAME:
+                return attrs.get("value", "")
+            pos = text.find(VIEW_STATE_NAME, pos + len(VIEW_STATE_NAME))
+        return "" if final else None
+
+    def scan_view_state_bytes(self, buf, final, encoding):
+        # scan_view_state on the undecoded body; only the tag is decoded
+        name = VIEW_STATE_NAME.encode()
+        pos = buf.find(name)
+        while pos >= 0:
+            start = buf.rfind(b"<", 0, pos)
+            end = buf.find(b">", pos)
+            if start < 0 or end < 0:
+                return None if not final else ""
+            tag = bytes(buf[start:end + 1]).decode(encoding, errors="replace")
+            attrs = parse_attrs(tag)
+            if tag[:6].lower() == "<input" and attrs.get("name") == VIEW_STATE_NAME:
+                return attrs.get("value", "")
+            pos = buf.find(name, pos + len(name))
+        return "" if final else None
+
+    def scan_group_options(self, text, final):
+        pos = text.find(GROUP_SELECT_ID)
+        while pos >= 0:
+            tag, start = enclosing_tag(text, pos)
+            if tag is None:
+                break
+            if tag[:7].lower() == "<select" and GROUP_SELECT_ID in parse_attrs(tag).get("id", ""):
+                end = text.find("</select", start)
+                if end < 0:
+                    return [] if final else None
+                opts = []
+                for m in OPTION_RE.finditer(text, start, end):
+                    opts.append((parse_attrs(f"<option {m.group(1)}>").get("value"),
+                                 strip_tags(m.group(2))))
+                return opts
+            pos = text.find(GROUP_SELECT_ID, pos + len(GROUP_SELECT_ID))
+        return [] if final else None
+
+    def scan_component_rows(self, text, final):
+        limit = len(text)
+        if not final:
+            pos = text.find(COMPONENT_CHECKBOX_ID)
+            limit = enclosing_table_end(text, pos) if pos >= 0 else -1
+            if limit < 0:
+                return None
+        rows = []
+        for m in INPUT_RE.finditer(text, 0, limit):
+            attrs = parse_attrs(m.group(0))
+            if attrs.get("type", "").lower() != "checkbox":
+                continue
+            row_start = text.rfind("<tr", 0, m.start())
+            while row_start >= 0 and not TR_OPEN_RE.match(text, row_start):
+                row_start = text.rfind("<tr", 0, row_start)
+            row_end = text.find("</tr", m.end())
+            row_text = row_cells(text[row_start:row_end]) if row_start >= 0 and row_end >= 0 else ""
+            rows.append((attrs.get("id", ""), row_text))
+        return rows
+
+    def view_state(self, text):
+        return self.scan_view_state(text, True) or None
+
+    def group_options(self, text):
+        return self.scan_group_options(text, True)
+
+    def component_rows(self, text):
+        return self.scan_component_rows(text, True)
+
+    def form(self, text, form_id=None):
+        for m in FORM_RE.finditer(text):
+            attrs = parse_attrs(m.group(0))
+            if form_id and attrs.get("id") != form_id:
+                continue
+            end = text.find("</form", m.end())
+            body = text[m.end():end if end >= 0 else len(text)]
+            fields = {}
+            for i in INPUT_RE.finditer(body):
+                a = parse_attrs(i.group(0))
+                if a.get("name"):
+                    fields[a["name"]] = a.get("value", "")
+            return attrs.get("action"), fields
+        return None
+
+    def _scan(self, field, buf, text, encoding, final):
+        if field == VIEW_STATE and ascii_compatible(encoding):
+            return self.scan_view_state_bytes(buf, final, encoding)
+        return getattr(self, "scan_" + field)(text, final)
+
+    def _needs_text(self, fields, encoding):
+        return any(f != VIEW_STATE or not ascii_compatible(encoding) for f in fields)
+
+    def extract_bytes(self, content, encoding, fields):
+        text = ""
+        self.decode_time = 0.0
+        if self._needs_text(fields, encoding):
+            t0 = time.perf_counter()
+            text = content.decode(encoding, errors="replace")
+            self.decode_time = time.perf_counter() - t0
+        found = {f: self._scan(f, content, text, encoding, True) for f in fields}
+        if found.get(VIEW_STATE) == "":
+            found[VIEW_STATE] = None
+        return found
+
+    def extract_stream(self, res, fields):
+        # Scan while the body downloads and stop scanning as soon as every
+        # field is found. The rest of the body is still read (unscanned) so
+        # the connection can go back to the pool and res.content stays valid.
+        # Text is only decoded while a field other than the ViewState is
+        # still missing.
+        chunks, buf, text, found = [], bytearray(), "", {}
+        pending = list(fields)
+        encoding = decoder = None
+        parse_time = decode_time = 0.0
+        it = res.iter_content(CHUNK_SIZE)
+        for chunk in it:
+            chunks.append(chunk)
+            t0 = time.perf_counter()
+            if encoding is None:
+                encoding = page_encoding(res, chunk)
+                decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+            buf += chunk
+            if self._needs_text(pending, encoding):
+                t1 = time.perf_counter()
+                text += decoder.decode(chunk)
+                decode_time += time.perf_counter() - t1
+            for f in list(pending):
+                value = self._scan(f, buf, text, encoding, False)
+                if value is not None:
+                    found[f] = value
+                    pending.remove(f)
+            parse_time += time.perf_counter() - t0
+            if not pending:
+                break
+        chunks.extend(it)
+        res._content = b"".join(chunks)
+        res._content_consumed = True
+        t0 = time.perf_counter()
+        if encoding is None:
+            encoding = page_encoding(res)
+            decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+        res.encoding = encoding
+        if pending:
+            if self._needs_text(pending, encoding):
+                text += decoder.decode(b"", final=True)
+            for f in pending:
+                found[f] = self._scan(f, buf, text, encoding, True)
+        if found.get(VIEW_STATE) == "":
+            found[VIEW_STATE] = None
+        self.parse_time = parse_time + time.perf_counter() - t0
+        self.decode_time = decode_time
+        return found
+
+
+# ==========================================
+# 4. Fallback wrapper / selection
+# ==========================================
+class FallbackExtractor(Extractor):
+    def __init__(self, primary, fallback):
+        self.primary, self.fallback = primary, fallback
+        self.name = f"{primary.name}+{fallback.name}"
+
+    def _missing(self, found):
+        return [f for f, v in found.items() if not v]
+
+    def _retry(self, text, found):
+        missing = self._missing(found)
+        if missing:
+            logger.debug(f"{self.primary.name} extractor missed {missing}, "
+                         f"retrying with {self.fallback.name}")
+            found.update(self.fallback.extract(text, missing))
+        return found
+
+    def extract(self, text, fields):
+        return self._retry(text, self.primary.extract(text, fields))
+
+    def extract_bytes(self, content, encoding, fields):
+        found = self.primary.extract_bytes(content, encoding, fields)
+        self.decode_time = self.primary.decode_time
+        if self._missing(found):
+            t0 = time.perf_counter()
+            text = content.decode(encoding, errors="replace")
+            self.decode_time += time.perf_counter() - t0
+            self._retry(text, found)
+        return found
+
+    def extract_stream(self, res, fields):
+        found = self.primary.extract_stream(res, fields)
+        self.parse_time = self.primary.parse_time
+        self.decode_time = self.primary.decode_time
+        if self._missing(found):
+            t0 = time.perf_counter()
+            text = res.content.decode(res.encoding, errors="replace")
+            self.decode_time += time.perf_counter() - t0
+            self._retry(text, found)
+            self.parse_time += time.perf_counter() - t0
+        return found
+
+    def view_state(self, text):
+        return self.primary.view_state(text) or self.fallback.view_state(text)
+
+    def group_options(self, text):
+        return self.primary.group_options(text) or self.fallback.group_options(text)
+
+    def component_rows(self, text):
+        return self.primary.component_rows(text) or self.fallback.component_rows(text)
+
+    def form(self, text, form_id=None):
+        return self.primary.form(text, form_id) or self.fallback.form(text, form_id)
+
+
+BACKENDS = {"scan": ScanExtractor, "lxml": LxmlExtractor, "soup": SoupExtractor}
+
+
+def get_extractor(name="scan", fallback=True):
+    try:
+        primary = BACKENDS[name]()
+    except ImportError:
+        logger.debug(f"{name} extractor unavailable, using scan")
+        primary = ScanExtractor()
+    if not fallback or primary.name == "soup":
+        return primary
+    try:
+        return FallbackExtractor(primary, SoupExtractor())
+    except ImportError:
+        return primary
@@ -0,0 +1,87 @@
+# Pause between subject requests. "adaptive" moves on as soon as the last
+# subject is done, but keeps a minimum interval between subjects, honors
+# Retry-After and backs off while the server answers with errors.
+# "fixed" is the original constant pause after every subject.
+import time
+from email.utils import parsedate_to_datetime
+
+ADAPTIVE, FIXED = "adaptive", "fixed"
+FIXED_DELAY = 0.3
+MIN_INTERVAL = 0.2
+BACKOFF_START = 0.5
+MAX_WAIT = 30.0
+
+
+def retry_after(res):
+    # Seconds from a Retry-After header (delta or HTTP date), or None. A
+    # date is taken relative to the response's own Date header, so the
+    # local clock's error does not matter.
+    value = res.headers.get("Retry-After")
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        until = parsedate_to_datetime(value)
+        sent = res.headers.get("Date")
+        now = parsedate_to_datetime(sent).timestamp() if sent else time.time()
+        return max(0.0, until.timestamp() - now)
+    except (TypeError, ValueError):
+        return None
+
+
+def is_error_page(res):
+    return res.status_code == 429 or res.status_code >= 500
+
+
+class Pacer:
+    def __init__(self, mode=ADAPTIVE, min_interval=MIN_INTERVAL, fixed_delay=FIXED_DELAY,
+                 max_wait=MAX_WAIT):
+        if mode not in (ADAPTIVE, FIXED):
+            raise ValueError(f"Unknown pacing mode: {mode}")
+        self.mode = mode
+        self.min_interval = min_interval
+        self.fixed_delay = fixed_delay
+        self.max_wait = max_wait
+        self.last_start = None
+        self.not_before = 0.0
+        self.backoff = 0.0
+        self.errors = 0
+
+    def observe(self, res, *args, **kwargs):
+        # Response hook
+        if is_error_page(res):
+            self.errors += 1
+        wait = retry_after(res)
+        if wait is not None:
+            self.not_before = max(self.not_before, time.monotonic() + min(wait, self.max_wait))
+
+    def begin(self):
+        self.last_start = time.monotonic()
+        self.errors = 0
+
+    def end(self):
+        # Error pages (429/5xx) double the backoff; a subject without any
+        # resets it. A subject that failed for its own reasons (full group,
+        # no match) says nothing about server load. Retry-After is kept
+        # separately in not_before.
+        if not self.errors:
+            self.backoff = 0.0
+        else:
+            self.backoff = min(self.max_wait, self.backoff * 2 or BACKOFF_START)
+
+    def retry_after(self):
+        # What the server asked for, for the run's own retry delays
+        return max(0.0, self.not_before - time.monotonic())
+
+    def delay(self):
+        # Seconds to wait before the next subject (or the cart confirmation)
+        if self.mode == FIXED:
+            return self.fixed_delay
+        now = time.monotonic()
+        wait = self.backoff
+        if self.last_start is not None:
+            wait = max(wait, self.last_start + self.min_interval - now)
+        wait = max(wait, self.not_before - now)
+        return min(max(wait, 0.0), self.max_wait)
@@ -1,62 +1,24 @@
-import json
 import logging
 import os
 import re
 import sys
-import time
-from datetime import datetime
-from pathlib import Path
-from urllib.parse import urljoin
-
-import requests
-from bs4 import BeautifulSoup
-from PyQt6.QtCore import QDateTime, QObject, Qt, QThread, QTimer, pyqtSignal
-from PyQt6.QtGui import QFont, QIcon
+import threading
+from collections import deque
+
+from common import (formatter, get_history_path, load_courses_csv, load_courses_from_file,
+                    logger, save_courses_csv, save_courses_to_file, subjects_from_courses)
+from PyQt6.QtCore import (QAbstractTableModel, QDateTime, QModelIndex, Qt, QThread, QTimer,
+                          pyqtSignal)
+from PyQt6.QtGui import QColor, QFont, QIcon
 # Using PyQt6
-from PyQt6.QtWidgets import (QApplication, QDateTimeEdit, QFormLayout,
-                             QGroupBox, QHBoxLayout, QHeaderView, QLabel,
-                             QLineEdit, QMainWindow, QMessageBox, QPushButton,
-                             QTableWidget, QTableWidgetItem, QTextEdit,
-                             QVBoxLayout, QWidget)
+from PyQt6.QtWidgets import (QApplication, QCheckBox, QDateTimeEdit, QDialog, QFileDialog,
+                             QFormLayout, QGroupBox, QHBoxLayout, QHeaderView, QLabel,
+                             QLineEdit, QMainWindow, QMessageBox, QPlainTextEdit,
+                             QPushButton, QSpinBox, QTableView, QVBoxLayout, QWidget)
 
 
 # ==========================================
-# 0. Persistence Helpers (Save/Load)
-# ==========================================
-def get_data_dir():
-    appdata = os.getenv("APPDATA")
-    if appdata:
-        path = Path(appdata) / "PolyURegBot"
-    else:
-        path = Path.home() / ".polyu_reg_bot"
-    path.mkdir(parents=True, exist_ok=True)
-    return path
-
-
-def get_courses_path():
-    return get_data_dir() / "courses.json"
-
-
-def load_courses_from_file():
-    path = get_courses_path()
-    if not path.exists():
-        return None
-    try:
-        return json.loads(path.read_text(encoding="utf-8"))
-    except Exception:
-        return None
-
-
-def save_courses_to_file(courses):
-    path = get_courses_path()
-    try:
-        path.write_text(json.dumps(courses, ensure_ascii=False,
-                        indent=2), encoding="utf-8")
-    except Exception as e:
-        print(f"Save failed: {e}")
-
-# ==========================================
-# 1. Path Helper
+# 0. Path Helper
 # ==========================================
 
 
@@ -69,218 +31,251 @@ def get_resource_path(relative_path):
 
 
 # ==========================================
-# 2. Log Handler
+# 1. Log Handler
 # ==========================================
-class SignallableLogHandler(logging.Handler, QObject):
-    log_signal = pyqtSignal(str)
+LOG_FLUSH_MS = 100
+LOG_BUFFER_LINES = 2000
+LOG_VIEW_LINES = 5000
 
-    def __init__(self):
-        logging.Handler.__init__(self)
-        QObject.__init__(self)
+
+class BufferedLogHandler(logging.Handler):
+    # emit() only formats and queues the line, so logging from the worker
+    # never waits for the GUI; the window drains the queue on a timer.
+    def __init__(self, capacity=LOG_BUFFER_LINES):
+        super().__init__()
+        self.buffer = deque(maxlen=capacity)
+        self.dropped = 0
 
     def emit(self, record):
         msg = self.format(record)
-        self.log_signal.emit(msg)
-
+        if len(self.buffer) == self.buffer.maxlen:
+            self.dropped += 1
+        self.buffer.append(msg)
 
-logger = logging.getLogger("PolyURegBot")
-logger.setLevel(logging.INFO)
-formatter = logging.Formatter('%(asctime)s - %(message)s')
+    def drain(self):
+        self.acquire()
+        try:
+            lines = list(self.buffer)
+            self.buffer.clear()
+            dropped, self.dropped = self.dropped, 0
+        finally:
+            self.release()
+        if dropped:
+            lines.insert(0, f"... {dropped} log lines dropped ...")
+        return lines
 
 
 # ==========================================
-# 3. Core Logic
+# 2. Background Worker
 # ==========================================
-class CourseRegistrationSystem:
-    def __init__(self, user_id, password):
-        self.myid = user_id
-        self.myPassword = password
-        self.session = requests.Session()
-        self.headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-        }
-        self.view_state = None
-        self.base_url = "https://www38.polyu.edu.hk/eStudent/"
-        self.acad_year_sem_url = urljoin(
-            self.base_url, "secure/my-subject-registration/subject-register-select-acad-year-sem.jsf")
-        self.subject_selection_url = urljoin(
-            self.base_url, "secure/my-subject-registration/subject-register-select-subject.jsf")
-        self.component_selection_url = urljoin(
-            self.base_url, "secure/my-subject-registration/subject-register-select-component.jsf")
-        self.preview_confirmation_url = urljoin(
-            self.base_url, "secure/my-subject-registration/subject-register-preview-confirmation.jsf")
-
-    def update_view_state(self, soup):
-        vs = soup.find("input", {"name": "javax.faces.ViewState"})
-        if vs:
-            self.view_state = vs["value"]
-            return True
-        return False
+def preload_core():
+    # requests, urllib3 and the parsers are only needed once a run starts;
+    # importing them here keeps them off the window's startup path
+    try:
+        import reg_core  # noqa: F401
+        import bs4  # noqa: F401
+    except ImportError:
+        pass
 
-    def login(self):
-        try:
-            logger.info("Step 1: Connecting to PolyU Auth Server...")
-            start_url = "https://www38.polyu.edu.hk/eStudent/SAML_callback?eStudver=2"
-            res = self.session.get(start_url, headers=self.headers)
-            soup = BeautifulSoup(res.text, 'html.parser')
-            form = soup.find('form', id='loginForm')
-            if not form:
-                return False
-            post_url = urljoin(res.url, form.get('action'))
-            payload = {tag.get('name'): tag.get('value', '')
-                       for tag in form.find_all('input') if tag.get('name')}
-            payload['UserName'] = 'hh\\' + self.myid
-            payload['Password'] = self.myPassword
-            logger.info(
-                "Step 2: Submitting credentials for ADFS Authentication...")
-            res = self.session.post(
-                post_url, data=payload, headers=self.headers)
-            if "SAMLResponse" not in res.text:
-                logger.error("Login Failed: Check your ID and Password.")
-                return False
-            logger.info("Step 3: ADFS Authenticated. Returning to eStudent...")
-            soup = BeautifulSoup(res.text, 'html.parser')
-            saml_form = soup.find('form')
-            sp_url = urljoin(res.url, saml_form.get('action'))
-            saml_payload = {tag.get('name'): tag.get(
-                'value', '') for tag in saml_form.find_all('input') if tag.get('name')}
-            final_res = self.session.post(
-                sp_url, data=saml_payload, headers=self.headers)
-            if final_res.ok:
-                logger.info("Step 4: Login successful. Home page reached.")
-                return True
-            return False
-        except Exception as e:
-            logger.error(f"Login Error: {e}")
-            return False
 
-    def select_acad_year_sem(self):
-        try:
-            logger.info(
-                "Step 5: Accessing Academic Year/Semester selection...")
-            res = self.session.get(
-                self.acad_year_sem_url, headers=self.headers)
-            self.update_view_state(BeautifulSoup(res.text, 'html.parser'))
-            data = {"mainForm": "mainForm", "mainForm:nextButton": "Go",
-                    "javax.faces.ViewState": self.view_state}
-            res = self.session.post(
-                self.acad_year_sem_url, data=data, headers=self.headers)
-            res = self.session.get(
-                self.subject_selection_url, headers=self.headers)
-            self.update_view_state(BeautifulSoup(res.text, 'html.parser'))
-            return True
-        except Exception as e:
-            logger.error(f"Step 5 Failed: {e}")
-            return False
+class Worker(QThread):
+    finished_signal = pyqtSignal(bool, str)
+    clock_signal = pyqtSignal(float, float)
 
-    def add_subject(self, code, group, comps):
-        try:
-            logger.info(f"Processing: {code} (Group: {group})")
-            data = {"mainForm": "mainForm", "mainForm:basicSearchSubjectCode": code,
-                    "mainForm:basicSearchButton": "Search", "javax.faces.ViewState": self.view_state}
-            res = self.session.post(
-                self.subject_selection_url, data=data, headers=self.headers)
-            soup = BeautifulSoup(res.text, 'html.parser')
-            self.update_view_state(soup)
-            target_val = None
-            select = soup.find(
-                "select", {"id": lambda x: x and "basicSearchSubjectGroup_" in x})
-            if select:
-                for opt in select.find_all("option"):
-                    if group in opt.text:
-                        target_val = opt.get('value')
-                        break
-            if not target_val:
-                logger.warning(f"Group {group} not found for {code}")
-                return False
-            data = {"mainForm": "mainForm", "mainForm:basicSearchSubjectCode": code,
-                    f"mainForm:basicSearchTable:0:basicSearchSubjectGroup_": target_val,
-                    f"mainForm:basicSearchTable:0:basicSearchAddSubjectButton_": "+",
-                    "javax.faces.ViewState": self.view_state}
-            res = self.session.post(
-                self.subject_selection_url, data=data, headers=self.headers)
-            comp_soup = BeautifulSoup(res.text, 'html.parser')
-            self.update_view_state(comp_soup)
-            comp_data = {"mainForm": "mainForm", "mainForm:selectCompSubjectGroup": target_val,
-                         "mainForm:selectButton": "Add to Cart", "javax.faces.ViewState": self.view_state}
-            found = False
-            for chk in comp_soup.find_all("input", {"type": "checkbox"}):
-                row_text = chk.find_parent("tr").text
-                for c in comps:
-                    if c in row_text:
-                        match = re.search(
-                            r':(\d+):selectCompSelected_', chk.get('id', ''))
-                        if match:
-                            comp_data[f"mainForm:ComponentTable:{match.group(1)}:selectCompSelected_"] = "on"
-                            found = True
-            if found:
-                res = self.session.post(
-                    self.component_selection_url, data=comp_data, headers=self.headers)
-                self.update_view_state(BeautifulSoup(res.text, 'html.parser'))
-                logger.info(f"Successfully added {code} to cart.")
-                return True
-            return False
-        except Exception as e:
-            logger.error(f"Error adding {code}: {e}")
-            return False
+    def __init__(self, uid, pwd, subjects, **options):
+        super().__init__()
+        # Usually already imported by preload_core
+        from reg_core import RegistrationRun
+        self.pipeline = RegistrationRun(uid, pwd, subjects,
+                                        on_clock=self.clock_signal.emit, **options)
+        self.abort_event = self.pipeline.abort_event
 
-    def finalize(self):
-        try:
-            logger.info("Step 6: Confirming Shopping Cart...")
-            data = {"mainForm": "mainForm", "mainForm:confirmButton": "Proceed to Preview",
-                    "javax.faces.ViewState": self.view_state}
-            res = self.session.post(
-                self.subject_selection_url, data=data, headers=self.headers)
-            self.update_view_state(BeautifulSoup(res.text, 'html.parser'))
-            data = {"mainForm": "mainForm", "mainForm:confirmButton": "Confirm",
-                    "javax.faces.ViewState": self.view_state}
-            res = self.session.post(
-                self.preview_confirmation_url, data=data, headers=self.headers)
-            if "success" in res.text.lower() or "成功" in res.text:
-                logger.info(">>> ALL TASKS COMPLETED SUCCESSFULLY! <<<")
-                return True
-            return False
-        except Exception as e:
-            logger.error(f"Final submission failed: {e}")
-            return False
+    def abort(self):
+        self.pipeline.abort()
+
+    def run(self):
+        ok, msg = self.pipeline.run()
+        self.finished_signal.emit(ok, msg)
 
 
 # ==========================================
-# 4. Background Worker
+# 3. Subject Table Model
 # ==========================================
-class Worker(QThread):
-    finished_signal = pyqtSignal(bool, str)
+GROUP_RE = re.compile(r"^[0-9A-Za-z]+$")
+ISSUE_COLOR = QColor("#FFCDD2")
+
+
+class CourseTableModel(QAbstractTableModel):
+    # The subject list itself, one dict per row as saved in courses.json.
+    # by_code indexes the rows by code, so an edit only re-checks the rows
+    # sharing the old or new code; issues holds the problems per row.
+    HEADERS = ("Code", "Group", "Components")
+    TOOLTIPS = (None,
+                "Fallback groups in order of preference, separated by '/',\n"
+                "e.g. 2001 / 2002",
+                "Component set for each group, separated by '/',\n"
+                "e.g. LTL001,T001 / LTL002,T002")
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.rows = []
+        self.by_code = {}
+        self.issues = {}
+
+    # ---- Qt model interface ----
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if orientation != Qt.Orientation.Horizontal:
+            return None
+        if role == Qt.ItemDataRole.DisplayRole:
+            return self.HEADERS[section]
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return self.TOOLTIPS[section]
+        return None
 
-    def __init__(self, uid, pwd, subjects):
-        super().__init__()
-        self.uid, self.pwd, self.subjects = uid, pwd, subjects
+    def flags(self, index):
+        return super().flags(index) | Qt.ItemFlag.ItemIsEditable
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        row = self.rows[index.row()]
+        col = index.column()
+        if role in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.EditRole):
+            return (row["code"], row["group"], ",".join(row["components"]))[col]
+        issue = self.issues.get(id(row), {}).get(col)
+        if role == Qt.ItemDataRole.BackgroundRole and issue:
+            return ISSUE_COLOR
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return issue
+        return None
 
-    def run(self):
-        bot = CourseRegistrationSystem(self.uid, self.pwd)
-        if not bot.login():
-            self.finished_signal.emit(False, "Login failed.")
-            return
-        if not bot.select_acad_year_sem():
-            self.finished_signal.emit(False, "Semester selection failed.")
-            return
-        success_any = False
-        for s in self.subjects:
-            if bot.add_subject(s[0], s[1], s[2]):
-                success_any = True
-            time.sleep(0.3)
-        if success_any:
-            if bot.finalize():
-                self.finished_signal.emit(
-                    True, "Process finished successfully.")
-            else:
-                self.finished_signal.emit(False, "Failed to submit cart.")
+    def setData(self, index, value, role=Qt.ItemDataRole.EditRole):
+        if role != Qt.ItemDataRole.EditRole:
+            return False
+        row = self.rows[index.row()]
+        value = value.strip()
+        if index.column() == 0:
+            old = row["code"]
+            self._unindex(row)
+            row["code"] = value
+            self._index(row)
+            self.check(old, value)
+            self.check_row(row)
+        elif index.column() == 1:
+            row["group"] = value
+            self.check_row(row)
         else:
-            self.finished_signal.emit(False, "No subjects were added.")
+            row["components"] = [x.strip() for x in value.split(",") if x.strip()]
+            self.check_row(row)
+        self.dataChanged.emit(index, index)
+        return True
+
+    def insertRows(self, position, count, parent=QModelIndex()):
+        self.beginInsertRows(parent, position, position + count - 1)
+        for i in range(count):
+            self.rows.insert(position + i, {"code": "", "group": "", "components": []})
+        self.endInsertRows()
+        return True
+
+    def removeRows(self, position, count, parent=QModelIndex()):
+        if position < 0 or position + count > len(self.rows):
+            return False
+        self.beginRemoveRows(parent, position, position + count - 1)
+        removed = self.rows[position:position + count]
+        del self.rows[position:position + count]
+        for row in removed:
+            self._unindex(row)
+            self.issues.pop(id(row), None)
+        self.endRemoveRows()
+        self.check(*(row["code"] for row in removed))
+        return True
+
+    # ---- validation index ----
+    @staticmethod
+    def key(code):
+        return code.strip().upper()
+
+    def _index(self, row):
+        if self.key(row["code"]):
+            self.by_code.setdefault(self.key(row["code"]), []).append(row)
+
+    def _unindex(self, row):
+        same = self.by_code.get(self.key(row["code"]))
+        if same and row in same:
+            same.remove(row)
+            if not same:
+                del self.by_code[self.key(row["code"])]
+
+    def check(self, *codes):
+        # Re-checks every row with one of these codes
+        for code in codes:
+            for row in list(self.by_code.get(self.key(code), ())):
+                self.check_row(row)
+
+    def check_row(self, row, notify=True):
+        issues = {}
+        code = self.key(row["code"])
+        group = row["group"]
+        comps = ",".join(row["components"])
+        if code and len(self.by_code.get(code, ())) > 1:
+            issues[0] = f"{code} is listed {len(self.by_code[code])} times."
+        elif not code and (group or comps):
+            issues[0] = "Code is missing."
+        if code or group or comps:
+            if not group:
+                issues[1] = "Group is missing."
+            elif not all(GROUP_RE.match(g.strip()) for g in group.split("/")):
+                issues[1] = "Groups are group numbers separated by '/'."
+            if not comps:
+                issues[2] = "No components."
+            elif any(not s.replace(",", "").strip() for s in comps.split("/")):
+                issues[2] = "Empty component set between '/'."
+        old = self.issues.get(id(row), {})
+        if issues:
+            self.issues[id(row)] = issues
+        else:
+            self.issues.pop(id(row), None)
+        if notify and issues != old and row in self.rows:
+            r = self.rows.index(row)
+            self.dataChanged.emit(self.index(r, 0), self.index(r, len(self.HEADERS) - 1))
+
+    def problems(self):
+        lines = []
+        for r, row in enumerate(self.rows):
+            for col, msg in sorted(self.issues.get(id(row), {}).items()):
+                lines.append(f"Row {r + 1}: {msg}")
+        return lines
+
+    # ---- course list ----
+    def set_courses(self, courses):
+        self.beginResetModel()
+        self.rows = [{"code": c.get("code", "").strip(), "group": c.get("group", "").strip(),
+                      "components": [x.strip() for x in c.get("components", []) if x.strip()]}
+                     for c in courses]
+        self.by_code, self.issues = {}, {}
+        for row in self.rows:
+            self._index(row)
+        for row in self.rows:
+            self.check_row(row, notify=False)
+        self.endResetModel()
+
+    def courses(self):
+        return [dict(row) for row in self.rows if row["code"]]
+
+    def subjects(self):
+        return subjects_from_courses(self.rows)
 
 
 # ==========================================
-# 5. GUI Main Window
+# 4. GUI Main Window
 # ==========================================
+HANDOFF_SECONDS = 3
+
+
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -290,14 +285,19 @@ class MainWindow(QMainWindow):
 
         # State Variables
         self.is_schedule_active = False
+        self.is_armed = False
+        self.worker = None
+        self.clock_offset = 0.0
 
         self.setup_ui()
 
         # Setup Logger
-        self.log_handler = SignallableLogHandler()
+        self.log_handler = BufferedLogHandler()
         self.log_handler.setFormatter(formatter)
-        self.log_handler.log_signal.connect(self.append_log)
         logger.addHandler(self.log_handler)
+        self.log_timer = QTimer(self)
+        self.log_timer.timeout.connect(self.flush_logs)
+        self.log_timer.start(LOG_FLUSH_MS)
 
         # Timer setup
         self.timer = QTimer(self)
@@ -307,6 +307,12 @@ class MainWindow(QMainWindow):
         # Auto Load Data
         self.load_data()
 
+        # Network stack loads in the background once the window is up
+        QTimer.singleShot(0, self.start_preload)
+
+    def start_preload(self):
+        threading.Thread(target=preload_core, daemon=True).start()
+
     def setup_ui(self):
         central = QWidget()
         self.setCentralWidget(central)
@@ -325,8 +331,9 @@ class MainWindow(QMainWindow):
         # 2. Table Group
         gb_table = QGroupBox("Subject List")
         vl = QVBoxLayout(gb_table)
-        self.table = QTableWidget(0, 3)
-        self.table.setHorizontalHeaderLabels(["Code", "Group", "Components"])
+        self.model = CourseTableModel(self)
+        self.table = QTableView()
+        self.table.setModel(self.model)
         self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
 
         hl = QHBoxLayout()
@@ -334,8 +341,24 @@ class MainWindow(QMainWindow):
         btn_add.clicked.connect(self.add_row)
         btn_del = QPushButton("- Delete Row")
         btn_del.clicked.connect(self.del_row)
+        self.plan_btn = QPushButton("Prepare Plan (Dry Run)")
+        self.plan_btn.setToolTip(
+            "Log in and resolve every group and component now without adding\n"
+            "anything to the cart. Runs later reuse the result.")
+        self.plan_btn.clicked.connect(self.prepare_plan)
+        btn_import = QPushButton("Import CSV")
+        btn_import.setToolTip("Load a list of subjects: code, group, components per line.")
+        btn_import.clicked.connect(self.import_csv)
+        btn_export = QPushButton("Export CSV")
+        btn_export.clicked.connect(self.export_csv)
         hl.addWidget(btn_add)
         hl.addWidget(btn_del)
+        hl.addWidget(btn_import)
+        hl.addWidget(btn_export)
+        hl.addWidget(self.plan_btn)
+        btn_hist = QPushButton("Run History")
+        btn_hist.clicked.connect(self.show_history)
+        hl.addWidget(btn_hist)
 
         vl.addWidget(self.table)
         vl.addLayout(hl)
@@ -352,8 +375,34 @@ class MainWindow(QMainWindow):
         self.dt_edit.setDisplayFormat("yyyy-MM-dd HH:mm:ss")
         self.dt_edit.setCalendarPopup(True)
         time_layout.addWidget(self.dt_edit)
+        time_layout.addWidget(QLabel("Pre-login Lead (s):"))
+        self.lead_spin = QSpinBox()
+        self.lead_spin.setRange(0, 900)
+        self.lead_spin.setValue(60)
+        self.lead_spin.setToolTip(
+            "Log in and open subject selection this many seconds early,\n"
+            "so only the subject requests run at the scheduled time.")
+        time_layout.addWidget(self.lead_spin)
+        time_layout.addWidget(QLabel("Run Budget (s):"))
+        self.budget_spin = QSpinBox()
+        self.budget_spin.setRange(0, 900)
+        self.budget_spin.setValue(120)
+        self.budget_spin.setToolTip(
+            "Give up if the run has not finished this many seconds after it\n"
+            "starts (0 = no limit). Each step also has its own time limit.")
+        time_layout.addWidget(self.budget_spin)
+        self.fixed_pause_chk = QCheckBox("Fixed Pause")
+        self.fixed_pause_chk.setToolTip(
+            "Always wait 0.3 s after each subject, as older versions did.\n"
+            "Otherwise the next subject goes as soon as the server allows.")
+        time_layout.addWidget(self.fixed_pause_chk)
         ctrl_layout.addLayout(time_layout)
 
+        self.clock_lbl = QLabel(
+            "Server clock: not measured yet (measured during pre-login)")
+        self.clock_lbl.setStyleSheet("color: #607D8B;")
+        ctrl_layout.addWidget(self.clock_lbl)
+
         # Buttons Row
         btn_layout = QHBoxLayout()
 
@@ -373,6 +422,23 @@ class MainWindow(QMainWindow):
         """)
         self.run_btn.clicked.connect(self.start_manual)
 
+        # Cancel Button (Orange), only enabled while a worker is running
+        self.cancel_btn = QPushButton("CANCEL RUN")
+        self.cancel_btn.setFixedHeight(60)
+        self.cancel_btn.setEnabled(False)
+        self.cancel_btn.setStyleSheet("""
+            QPushButton {
+                background-color: #EF6C00; 
+                color: white; 
+                font-weight: bold; 
+                font-size: 14px; 
+                border-radius: 5px;
+            }
+            QPushButton:hover { background-color: #F57C00; }
+            QPushButton:disabled { background-color: #B0BEC5; }
+        """)
+        self.cancel_btn.clicked.connect(self.cancel_run)
+
         # Schedule Button (Green/Red Toggle)
         self.schedule_btn = QPushButton("START SCHEDULE")
         self.schedule_btn.setFixedHeight(60)
@@ -389,14 +455,16 @@ class MainWindow(QMainWindow):
         self.schedule_btn.clicked.connect(self.toggle_schedule)
 
         btn_layout.addWidget(self.run_btn)
+        btn_layout.addWidget(self.cancel_btn)
         btn_layout.addWidget(self.schedule_btn)
         ctrl_layout.addLayout(btn_layout)
 
         layout.addWidget(gb_controls)
 
         # 4. Logs
-        self.log_out = QTextEdit()
+        self.log_out = QPlainTextEdit()
         self.log_out.setReadOnly(True)
+        self.log_out.setMaximumBlockCount(LOG_VIEW_LINES)
         self.log_out.setStyleSheet(
             "background-color: #1e1e1e; color: #ffffff; font-family: Consolas;")
         layout.addWidget(QLabel("Logs:"))
@@ -404,9 +472,14 @@ class MainWindow(QMainWindow):
 
     def toggle_schedule(self):
         if not self.is_schedule_active:
+            if not self.confirm_subjects():
+                return
             # Enable Schedule
             self.is_schedule_active = True
             self.dt_edit.setEnabled(False)
+            self.lead_spin.setEnabled(False)
+            self.budget_spin.setEnabled(False)
+            self.fixed_pause_chk.setEnabled(False)
             self.schedule_btn.setText("STOP SCHEDULE")
             self.schedule_btn.setStyleSheet("""
                 QPushButton {
@@ -424,6 +497,13 @@ class MainWindow(QMainWindow):
             # Disable Schedule
             self.is_schedule_active = False
             self.dt_edit.setEnabled(True)
+            self.lead_spin.setEnabled(True)
+            self.budget_spin.setEnabled(True)
+            self.fixed_pause_chk.setEnabled(True)
+            if self.is_armed:
+                # Stopped by the user while the pre-armed worker is waiting
+                self.is_armed = False
+                self.worker.abort()
             self.schedule_btn.setText("START SCHEDULE")
             self.schedule_btn.setStyleSheet("""
                 QPushButton {
@@ -441,16 +521,31 @@ class MainWindow(QMainWindow):
         if not self.is_schedule_active:
             return
 
-        now = QDateTime.currentDateTime()
+        # Countdown in server time once the clock offset is known
+        now = QDateTime.currentDateTime().addMSecs(int(self.clock_offset * 1000))
         target = self.dt_edit.dateTime()
         seconds_left = now.secsTo(target)
 
+        lead = self.lead_spin.value()
+        if not self.is_armed and 0 < seconds_left <= max(lead, HANDOFF_SECONDS):
+            # Hand over to the worker, which fires by itself at the target on
+            # a precise timer; with a lead it also logs in right away
+            if lead:
+                logger.info(f"Pre-arming {seconds_left}s before target...")
+            if self.launch(start_at=target.toMSecsSinceEpoch() / 1000, pre_login=lead > 0):
+                self.is_armed = True
+            else:
+                self.toggle_schedule()
+                return
+
         if seconds_left <= 0:
             # Trigger!
             self.schedule_btn.setText("LAUNCHING...")
+            was_armed, self.is_armed = self.is_armed, False
             self.toggle_schedule()  # Reset UI
-            logger.info("Timer hit! Launching task...")
-            self.start_manual()
+            if not was_armed:
+                logger.info("Timer hit! Launching task...")
+                self.launch()
         else:
             # Update countdown on button
             hrs = seconds_left // 3600
@@ -466,89 +561,159 @@ class MainWindow(QMainWindow):
     def load_data(self):
         saved = load_courses_from_file()
         if saved and isinstance(saved, list):
-            self.table.setRowCount(0)
-            for item in saved:
-                r = self.table.rowCount()
-                self.table.insertRow(r)
-                self.table.setItem(
-                    r, 0, QTableWidgetItem(item.get("code", "")))
-                self.table.setItem(
-                    r, 1, QTableWidgetItem(item.get("group", "")))
-                self.table.setItem(r, 2, QTableWidgetItem(
-                    ",".join(item.get("components", []))))
+            self.model.set_courses(saved)
             logger.info(f"Loaded {len(saved)} courses from autosave.")
         else:
-            self.add_example("ABCT1D18", "2001", "LTL001")
+            self.model.set_courses(
+                [{"code": "ABCT1D18", "group": "2001", "components": ["LTL001"]}])
             logger.info("No autosave found. Loaded example.")
 
     def save_data(self):
-        courses = []
-        for i in range(self.table.rowCount()):
-            c = self.table.item(i, 0).text().strip(
-            ) if self.table.item(i, 0) else ""
-            g = self.table.item(i, 1).text().strip(
-            ) if self.table.item(i, 1) else ""
-            m = self.table.item(i, 2).text().strip(
-            ) if self.table.item(i, 2) else ""
-            if c:
-                comps = [x.strip() for x in m.split(',') if x.strip()]
-                courses.append({"code": c, "group": g, "components": comps})
-        save_courses_to_file(courses)
-
-    def add_row(self): self.table.insertRow(self.table.rowCount())
-
-    def add_example(self, c, g, m):
-        r = self.table.rowCount()
-        self.table.insertRow(r)
-        self.table.setItem(r, 0, QTableWidgetItem(c))
-        self.table.setItem(r, 1, QTableWidgetItem(g))
-        self.table.setItem(r, 2, QTableWidgetItem(m))
-
-    def del_row(self): self.table.removeRow(self.table.currentRow())
-
-    def append_log(self, text):
-        self.log_out.append(text)
-        self.log_out.verticalScrollBar().setValue(
-            self.log_out.verticalScrollBar().maximum())
+        save_courses_to_file(self.model.courses())
+
+    def add_row(self): self.model.insertRows(self.model.rowCount(), 1)
+
+    def del_row(self): self.model.removeRows(self.table.currentIndex().row(), 1)
+
+    def import_csv(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Import Subjects", "", "CSV files (*.csv)")
+        if not path:
+            return
+        try:
+            courses = load_courses_csv(path)
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Could not read {path}:\n{e}")
+            return
+        current = self.model.courses()
+        if current:
+            answer = QMessageBox.question(
+                self, "Import Subjects",
+                f"Replace the current {len(current)} subjects?\n(No adds the imported ones.)",
+                QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
+                | QMessageBox.StandardButton.Cancel)
+            if answer == QMessageBox.StandardButton.Cancel:
+                return
+            if answer == QMessageBox.StandardButton.No:
+                courses = current + courses
+        self.model.set_courses(courses)
+        logger.info(f"Imported {len(courses)} subjects from {path}.")
+        for line in self.model.problems():
+            logger.warning(line)
+
+    def export_csv(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Export Subjects", "subjects.csv",
+                                              "CSV files (*.csv)")
+        if not path:
+            return
+        try:
+            save_courses_csv(path, self.model.courses())
+            logger.info(f"Exported {len(self.model.courses())} subjects to {path}.")
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Could not write {path}:\n{e}")
+
+    def flush_logs(self):
+        lines = self.log_handler.drain()
+        if not lines:
+            return
+        bar = self.log_out.verticalScrollBar()
+        # Follow the tail unless the user has scrolled up to read
+        at_bottom = bar.value() >= bar.maximum() - 2
+        self.log_out.appendPlainText("\n".join(lines))
+        if at_bottom:
+            bar.setValue(bar.maximum())
+
+    def confirm_subjects(self):
+        # Asked before a run is started by hand, never when a schedule fires
+        problems = self.model.problems()
+        if not problems:
+            return True
+        more = f"\n... and {len(problems) - 10} more" if len(problems) > 10 else ""
+        answer = QMessageBox.question(
+            self, "Check Subjects", "\n".join(problems[:10]) + more + "\n\nContinue anyway?",
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
+        return answer == QMessageBox.StandardButton.Yes
 
     def start_manual(self):
+        if self.confirm_subjects():
+            self.launch()
+
+    def prepare_plan(self):
+        if self.confirm_subjects():
+            self.launch(plan_only=True)
+
+    def show_history(self):
+        from history import load_runs, report
+        dlg = QDialog(self)
+        dlg.setWindowTitle("Run History")
+        dlg.resize(680, 420)
+        view = QPlainTextEdit("\n".join(report(load_runs(get_history_path()))))
+        view.setReadOnly(True)
+        view.setStyleSheet(
+            "background-color: #1e1e1e; color: #ffffff; font-family: Consolas;")
+        QVBoxLayout(dlg).addWidget(view)
+        dlg.exec()
+
+    def cancel_run(self):
+        if not self.worker or not self.worker.isRunning():
+            return
+        logger.info("Cancelling run...")
+        if self.is_armed:
+            self.toggle_schedule()
+        else:
+            self.worker.abort()
+
+    def launch(self, start_at=None, pre_login=True, plan_only=False):
         uid, pwd = self.id_in.text().strip(), self.pw_in.text().strip()
         if not uid or not pwd:
             QMessageBox.warning(
                 self, "Warning", "Please enter ID and Password.")
-            return
-
-        subjects = []
-        for i in range(self.table.rowCount()):
-            c = self.table.item(i, 0).text().strip(
-            ) if self.table.item(i, 0) else ""
-            g = self.table.item(i, 1).text().strip(
-            ) if self.table.item(i, 1) else ""
-            m = self.table.item(i, 2).text().strip(
-            ) if self.table.item(i, 2) else ""
-            if c and g:
-                subjects.append([c.upper(), g, [x.strip()
-                                for x in m.split(',')]])
+            return False
 
+        subjects = self.model.subjects()
         if not subjects:
             QMessageBox.warning(self, "Warning", "List is empty.")
-            return
+            return False
+        for line in self.model.problems():
+            logger.warning(line)
 
         # UI Lock
         self.run_btn.setEnabled(False)
-        self.run_btn.setText("RUNNING...")
+        self.plan_btn.setEnabled(False)
+        self.cancel_btn.setEnabled(True)
+        self.run_btn.setText("PLANNING..." if plan_only else "RUNNING...")
+        self.flush_logs()
         self.log_out.clear()
 
         self.save_data()
 
-        self.worker = Worker(uid, pwd, subjects)
+        self.worker = Worker(uid, pwd, subjects, start_at=start_at,
+                             pre_login=pre_login, plan_only=plan_only,
+                             run_budget=self.budget_spin.value(),
+                             pacing="fixed" if self.fixed_pause_chk.isChecked() else "adaptive")
         self.worker.finished_signal.connect(self.on_done)
+        self.worker.clock_signal.connect(self.on_clock)
         self.worker.start()
+        return True
+
+    def on_clock(self, offset, error):
+        self.clock_offset = offset
+        # Timer wake-up jitter is about a millisecond on top of the offset error
+        self.clock_lbl.setText(
+            f"Server clock: {offset * 1000:+.0f} ms vs this PC (±{error * 1000:.0f} ms)   |   "
+            f"Expected trigger error: ±{error * 1000 + 1:.0f} ms")
 
     def on_done(self, ok, msg):
         self.run_btn.setEnabled(True)
+        self.plan_btn.setEnabled(True)
+        self.cancel_btn.setEnabled(False)
         self.run_btn.setText("RUN NOW")
-        if ok:
+        if self.is_armed:
+            # Pre-arm failed before the target time
+            self.is_armed = False
+            self.toggle_schedule()
+        if self.worker.abort_event.is_set():
+            logger.info(msg)
+        elif ok:
             QMessageBox.information(self, "Finished", msg)
         else:
             QMessageBox.critical(self, "Error", msg)
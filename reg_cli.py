@@ -0,0 +1,175 @@
+# Headless front end: runs the same registration as the GUI from a terminal,
+# cron or a systemd unit, without importing PyQt.
+#
+#   python reg_cli.py --now
+#   python reg_cli.py --at "2025-08-01 09:30:00" --lead 60 --log-file reg.log
+#   python reg_cli.py --history
+#
+# Settings come from a JSON config file (default: cli.json in the data
+# directory) and can be overridden on the command line:
+#
+#   {"user_id": "21012345d", "password": "...", "courses": "courses.json",
+#    "start_at": "2025-08-01 09:30:00", "lead": 60, "run_budget": 120,
+#    "pacing": "adaptive", "min_interval": 0.2, "log_file": "reg.log",
+#    "redact": ["CHAN Tai Man"]}
+#
+# The password can also be given in POLYU_REG_PASSWORD or typed at a prompt.
+import argparse
+import getpass
+import json
+import logging
+import os
+import signal
+import sys
+from datetime import datetime
+from pathlib import Path
+
+from common import (formatter, get_courses_path, get_data_dir, get_history_path,
+                    load_courses_csv, logger, subjects_from_courses)
+from history import load_runs, report
+from pacing import ADAPTIVE, FIXED, FIXED_DELAY, MIN_INTERVAL
+from reg_core import RegistrationRun
+from scheduler import wait_until
+
+HANDOFF_SECONDS = 3
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def load_config(path):
+    path = Path(path) if path else get_data_dir() / "cli.json"
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def is_seconds(value):
+    # JSON gives "60" or true as easily as 60
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and value >= 0
+
+
+def setup_logging(log_file):
+    handlers = [logging.StreamHandler(sys.stdout)]
+    if log_file:
+        handlers.append(logging.FileHandler(log_file, encoding="utf-8"))
+    for h in handlers:
+        h.setFormatter(formatter)
+        logger.addHandler(h)
+
+
+def parse_args(argv):
+    ap = argparse.ArgumentParser(description="PolyU subject registration without the GUI.")
+    ap.add_argument("--config", help="JSON config file (default: cli.json in the data directory)")
+    ap.add_argument("--courses",
+                    help="courses.json or a CSV list to register (default: the GUI's autosave)")
+    ap.add_argument("--user", help="student ID")
+    mode = ap.add_mutually_exclusive_group()
+    mode.add_argument("--now", action="store_true", help="run immediately")
+    mode.add_argument("--at", help=f"scheduled start, server time ({TIME_FORMAT.replace('%', '%%')})")
+    mode.add_argument("--plan", action="store_true", help="dry run: prepare and save the plan")
+    ap.add_argument("--lead", type=int, help="pre-login lead in seconds (0 = log in at the start time)")
+    ap.add_argument("--run-budget", type=float, help="give up after this many seconds (0 = no limit)")
+    ap.add_argument("--pacing", choices=(ADAPTIVE, FIXED),
+                    help=f"pause between subjects: as the server allows, or always {FIXED_DELAY:g}s")
+    ap.add_argument("--min-interval", type=float,
+                    help=f"adaptive pacing: least seconds between subjects (default {MIN_INTERVAL:g})")
+    ap.add_argument("--log-file", help="also append the log to this file")
+    ap.add_argument("--capture", action="store_true",
+                    help="save copies of the pages for bench/bench_replay.py; credentials, "
+                         "student numbers and e-mail addresses are blanked, your name only "
+                         "with --redact, other personal details not at all")
+    ap.add_argument("--redact", action="append", metavar="TEXT",
+                    help="with --capture: also blank this text, e.g. your name as eStudent "
+                         "shows it, in either word order (repeatable)")
+    ap.add_argument("--no-session-cache", action="store_true",
+                    help="always log in; do not reuse or save the encrypted session cookies")
+    ap.add_argument("--history", nargs="?", const=10, type=int, metavar="N",
+                    help="show the last N runs, compare the latest with earlier ones and exit")
+    return ap.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.history is not None:
+        print("\n".join(report(load_runs(get_history_path()), args.history)))
+        return 0
+    try:
+        config = load_config(args.config)
+    except (OSError, ValueError) as e:
+        print(f"Could not read config: {e}", file=sys.stderr)
+        return 2
+    setup_logging(args.log_file or config.get("log_file"))
+
+    uid = args.user or config.get("user_id")
+    pwd = config.get("password") or os.getenv("POLYU_REG_PASSWORD")
+    if uid and not pwd and sys.stdin.isatty():
+        pwd = getpass.getpass("Password: ")
+    if not uid or not pwd:
+        logger.error("Student ID and password are required.")
+        return 2
+
+    courses_path = Path(args.courses or config.get("courses") or get_courses_path())
+    try:
+        if courses_path.suffix.lower() == ".csv":
+            courses = load_courses_csv(courses_path)
+        else:
+            courses = json.loads(courses_path.read_text(encoding="utf-8"))
+        subjects = subjects_from_courses(courses)
+    except (OSError, ValueError) as e:
+        logger.error(f"Could not read {courses_path}: {e}")
+        return 2
+    if not subjects:
+        logger.error(f"No subjects in {courses_path}.")
+        return 2
+
+    start_at = None
+    when = args.at or (None if args.now or args.plan else config.get("start_at"))
+    if when:
+        try:
+            start_at = datetime.strptime(when, TIME_FORMAT).timestamp()
+        except (TypeError, ValueError):
+            logger.error(f"Start time must look like {datetime.now():{TIME_FORMAT}}.")
+            return 2
+    lead = args.lead if args.lead is not None else config.get("lead", 60)
+    budget = args.run_budget if args.run_budget is not None else config.get("run_budget", 120.0)
+    for name, value in (("lead", lead), ("run_budget", budget)):
+        if not is_seconds(value):
+            logger.error(f"{name} must be a number of seconds, not {value!r}.")
+            return 2
+    pacing = args.pacing or config.get("pacing", ADAPTIVE)
+    if pacing not in (ADAPTIVE, FIXED):
+        logger.error(f"Pacing must be '{ADAPTIVE}' or '{FIXED}', not {pacing!r}.")
+        return 2
+    min_interval = (args.min_interval if args.min_interval is not None
+                    else config.get("min_interval", MIN_INTERVAL))
+    if not is_seconds(min_interval):
+        logger.error(f"min_interval must be a number of seconds, not {min_interval!r}.")
+        return 2
+
+    redact = args.redact or config.get("redact", [])
+    if isinstance(redact, str):
+        redact = [redact]
+
+    run = RegistrationRun(uid, pwd, subjects, start_at=start_at, pre_login=lead > 0,
+                          plan_only=args.plan, run_budget=budget, capture=args.capture,
+                          redact=redact,
+                          session_cache=not args.no_session_cache and config.get("session_cache", True),
+                          pacing=pacing, min_interval=min_interval)
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *a: run.abort())
+
+    if start_at:
+        handoff = start_at - max(lead, HANDOFF_SECONDS)
+        logger.info(f"Scheduled for {when}; {len(subjects)} subjects, pre-login lead {lead}s.")
+        if start_at <= datetime.now().timestamp():
+            logger.error("Start time is in the past.")
+            return 2
+        if not wait_until(handoff, run.abort_event):
+            logger.info("Schedule stopped.")
+            return 1
+    ok, msg = run.run()
+    (logger.info if ok else logger.error)(msg)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,893 @@
+# Registration logic without any GUI dependency; reg_GUI.py and reg_cli.py
+# are thin front ends over RegistrationRun.
+import re
+import threading
+import time
+from datetime import datetime
+from urllib.parse import urljoin
+
+from requests import RequestException
+
+from capture import PageRecorder
+from common import (APP_VERSION, get_captures_dir, get_history_path, get_session_cache_path,
+                    get_traces_dir, load_plan, logger, plan_key, save_plan)
+from cookie_cache import CookieCache
+from deadline import BudgetExceeded, Cancelled, Deadline
+from history import append_run, compare, load_runs, summarize_run
+from html_extract import (CELL_SEP, COMPONENT_ROWS, GROUP_OPTIONS, VIEW_STATE, decode_page,
+                          get_extractor, has_marker, page_encoding, row_cells, strip_tags)
+from pacing import ADAPTIVE, MIN_INTERVAL, Pacer
+from scheduler import ClockOffset, wait_until
+from tracing import RunTrace
+from transport import build_session
+
+
+# ==========================================
+# 0. Core Logic
+# ==========================================
+ESTUDENT_BASE_URL = "https://www38.polyu.edu.hk/eStudent/"
+COMPONENT_INDEX_RE = re.compile(r":(\d+):selectCompSelected_")
+CELL_WORD_RE = re.compile(r"[^\s,;()/]+")
+SUCCESS_MARKERS = ("success", "成功")
+# JSF error messages ("group is full", "time clash", ...) after a cart post
+ERROR_MESSAGE_RE = re.compile(rb'class="[^"]*\berror\b[^"]*"[^>]*>([^<]*)<', re.I)
+
+
+class StepFailed(Exception):
+    pass
+
+
+# Failures worth another try: network trouble, an expired view, a budget.
+# Anything else is a bug or bad input and fails the same way every time.
+TRANSIENT_ERRORS = (RequestException, StepFailed, BudgetExceeded, Cancelled)
+
+
+def plan_group_matches(content, plan):
+    # The planned option value must still be offered for the planned group
+    pattern = (rb'<option\b[^>]*value="' + re.escape(plan["group_value"].encode())
+               + rb'"[^>]*>[^<]*' + re.escape(plan["group"].encode()))
+    return re.search(pattern, content) is not None
+
+
+def parse_alternatives(group, comps):
+    # Table cells list fallbacks separated by "/": group "2001 / 2002" with
+    # components "LTL001,T001 / LTL002" gives [("2001", [LTL001, T001]),
+    # ("2002", [LTL002])]. The shorter list repeats its last entry, so one
+    # group with two component sets tries both sets in that group. A cell
+    # with no group at all (" / ") gives nothing to try.
+    groups = [g.strip() for g in group.split("/") if g.strip()]
+    if not groups:
+        return []
+    sets = [[c.strip() for c in part.split(",") if c.strip()]
+            for part in ",".join(comps).split("/")]
+    sets = [s for s in sets if s] or [[]]
+    n = max(len(groups), len(sets))
+    return [(groups[min(i, len(groups) - 1)], sets[min(i, len(sets) - 1)]) for i in range(n)]
+
+
+def normalize_code(code):
+    return "".join(code.split()).upper()
+
+
+def index_components(rows):
+    # Normalized code -> checkbox indices of the rows showing it, as a whole
+    # cell or a word in one, so "T01" never matches a row for "T011"
+    index = {}
+    for chk_id, row_text in rows:
+        match = COMPONENT_INDEX_RE.search(chk_id)
+        if not match:
+            continue
+        keys = set()
+        for cell in row_text.split(CELL_SEP):
+            keys.add(normalize_code(cell))
+            keys.update(w.upper() for w in CELL_WORD_RE.findall(cell))
+        keys.discard("")
+        for key in keys:
+            index.setdefault(key, []).append(int(match.group(1)))
+    return index
+
+
+def lookup_components(index, comps):
+    # Returns (indices, missing, ambiguous); a code on several rows is not
+    # ticked at all rather than guessed
+    indices, missing, ambiguous = [], [], []
+    for c in comps:
+        found = index.get(normalize_code(c), [])
+        if not found:
+            missing.append(c)
+        elif len(found) > 1:
+            ambiguous.append(c)
+        elif found[0] not in indices:
+            indices.append(found[0])
+    return indices, missing, ambiguous
+
+
+def cart_rejection(content, code, encoding):
+    # Why the server did not take the add, or None if the subject is now in
+    # the cart
+    m = ERROR_MESSAGE_RE.search(content)
+    if m:
+        return strip_tags(m.group(1).decode(encoding, errors="replace")).strip() or "error on page"
+    if code.upper().encode() not in content.upper():
+        return "not in the cart"
+    return None
+
+
+def plan_components_match(content, plan, encoding):
+    if f'value="{plan["group_value"]}"'.encode() not in content:
+        return False
+    rows = []
+    for i in plan["component_indices"]:
+        chk_id = f"ComponentTable:{i}:selectCompSelected_"
+        pos = content.find(chk_id.encode())
+        start = content.rfind(b"<tr", 0, pos)
+        end = content.find(b"</tr", pos)
+        if pos < 0 or start < 0 or end < 0:
+            return False
+        rows.append((chk_id, row_cells(content[start:end].decode(encoding, errors="replace"))))
+    # Same rule as resolving live, over the planned rows only: every code
+    # found on exactly one of them, and together they tick the planned boxes
+    indices, missing, ambiguous = lookup_components(index_components(rows), plan["components"])
+    return not missing and not ambiguous and sorted(indices) == sorted(plan["component_indices"])
+
+
+class CourseRegistrationSystem:
+    def __init__(self, user_id, password, base_url=ESTUDENT_BASE_URL, extractor="scan",
+                 deadline=None, capture=False, redact=()):
+        self.myid = user_id
+        self.myPassword = password
+        self.trace = RunTrace()
+        self.deadline = deadline or Deadline()
+        self.session = build_session(self.trace, self.deadline)
+        self.extractor = get_extractor(extractor)
+        self.clock = ClockOffset()
+        self.session.hooks["response"].append(self.clock.observe_response)
+        # capture: keep redacted copies of every page for bench/bench_replay.py;
+        # redact: names (or other text) to blank in them besides the defaults
+        self.recorder = None
+        if capture:
+            self.recorder = PageRecorder(self.trace, secrets=(user_id, password), names=redact)
+            self.session.hooks["response"].append(self.recorder.observe)
+        self.headers = {
+            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+        }
+        self.view_state = None
+        # Whether the last failed step may succeed if tried again (network
+        # trouble, expired view) rather than being wrong input
+        self.retryable = False
+        self.base_url = base_url
+        self.acad_year_sem_url = urljoin(
+            self.base_url, "secure/my-subject-registration/subject-register-select-acad-year-sem.jsf")
+        self.subject_selection_url = urljoin(
+            self.base_url, "secure/my-subject-registration/subject-register-select-subject.jsf")
+        self.component_selection_url = urljoin(
+            self.base_url, "secure/my-subject-registration/subject-register-select-component.jsf")
+        self.preview_confirmation_url = urljoin(
+            self.base_url, "secure/my-subject-registration/subject-register-preview-confirmation.jsf")
+
+    def update_view_state(self, page):
+        vs = page.get(VIEW_STATE)
+        if vs:
+            self.view_state = vs
+            return True
+        return False
+
+    def read_page(self, res, *fields):
+        t0 = time.perf_counter()
+        page = self.extractor.extract_stream(res, (VIEW_STATE,) + fields)
+        parse_time = self.extractor.parse_time
+        self.trace.finish_download(res, time.perf_counter() - t0 - parse_time)
+        self.trace.add_parse(parse_time, self.extractor.decode_time)
+        ok = self.update_view_state(page)
+        self.trace.note_view_state(ok)
+        if not ok:
+            # Error pages (expired view, ADFS redirect) carry no ViewState
+            raise StepFailed(f"no ViewState in response (HTTP {res.status_code})")
+        return page
+
+    def login(self):
+        self.retryable = False
+        try:
+            logger.info("Step 1: Connecting to PolyU Auth Server...")
+            start_url = urljoin(self.base_url, "SAML_callback?eStudver=2")
+            self.trace.mark("login 1: auth server")
+            res = self.session.get(start_url, headers=self.headers)
+            with self.trace.parse():
+                form = self.extractor.form(decode_page(res), 'loginForm')
+            if not form:
+                return False
+            action, payload = form
+            post_url = urljoin(res.url, action)
+            payload['UserName'] = 'hh\\' + self.myid
+            payload['Password'] = self.myPassword
+            logger.info(
+                "Step 2: Submitting credentials for ADFS Authentication...")
+            self.trace.mark("login 2: credentials")
+            res = self.session.post(
+                post_url, data=payload, headers=self.headers)
+            if b"SAMLResponse" not in res.content:
+                logger.error("Login Failed: Check your ID and Password.")
+                return False
+            logger.info("Step 3: ADFS Authenticated. Returning to eStudent...")
+            with self.trace.parse():
+                action, saml_payload = self.extractor.form(decode_page(res))
+            sp_url = urljoin(res.url, action)
+            self.trace.mark("login 3-4: SAML callback, home")
+            final_res = self.session.post(
+                sp_url, data=saml_payload, headers=self.headers)
+            if final_res.ok:
+                logger.info("Step 4: Login successful. Home page reached.")
+                return True
+            return False
+        except Exception as e:
+            logger.error(f"Login Error: {e}")
+            self.retryable = isinstance(e, TRANSIENT_ERRORS)
+            return False
+        finally:
+            self.trace.end()
+
+    def select_acad_year_sem(self):
+        self.retryable = False
+        try:
+            logger.info(
+                "Step 5: Accessing Academic Year/Semester selection...")
+            self.trace.mark("semester: page")
+            res = self.session.get(
+                self.acad_year_sem_url, headers=self.headers, stream=True)
+            self.read_page(res)
+            data = {"mainForm": "mainForm", "mainForm:nextButton": "Go",
+                    "javax.faces.ViewState": self.view_state}
+            self.trace.mark("semester: select")
+            res = self.session.post(
+                self.acad_year_sem_url, data=data, headers=self.headers)
+            self.trace.mark("semester: subject page")
+            res = self.session.get(
+                self.subject_selection_url, headers=self.headers, stream=True)
+            self.read_page(res)
+            return True
+        except Exception as e:
+            logger.error(f"Step 5 Failed: {e}")
+            self.retryable = isinstance(e, TRANSIENT_ERRORS)
+            return False
+        finally:
+            self.trace.end()
+
+    def prewarm(self):
+        # Open kept-alive TLS connections to eStudent and ADFS ahead of time
+        try:
+            self.trace.mark("prewarm")
+            start_url = urljoin(self.base_url, "SAML_callback?eStudver=2")
+            res = self.session.get(
+                start_url, headers=self.headers, allow_redirects=False)
+            location = res.headers.get("Location")
+            if location:
+                self.session.get(urljoin(res.url, location),
+                                 headers=self.headers, allow_redirects=False)
+            return True
+        except Exception as e:
+            logger.warning(f"Connection pre-warm failed: {e}")
+            return False
+        finally:
+            self.trace.end()
+
+    def refresh_view_state(self):
+        # Cheap liveness check: an expired session is redirected to ADFS
+        # instead of returning the subject page with a fresh ViewState.
+        # True if alive, False if expired, None if the check itself failed
+        # (network trouble, budget), which says nothing about the session.
+        try:
+            self.trace.mark("session check")
+            res = self.session.get(
+                self.subject_selection_url, headers=self.headers, allow_redirects=False, stream=True)
+            if res.status_code != 200:
+                res.close()
+                return False
+            return self.update_view_state(self.read_page(res))
+        except StepFailed:
+            return False
+        except Exception as e:
+            logger.warning(f"Session check failed: {e}")
+            return None
+        finally:
+            self.trace.end()
+
+    # ---- subject steps (shared by add_subject and prepare_plan) ----
+    def search_subject(self, code):
+        data = {"mainForm": "mainForm", "mainForm:basicSearchSubjectCode": code,
+                "mainForm:basicSearchButton": "Search", "javax.faces.ViewState": self.view_state}
+        self.trace.mark(f"{code}: search")
+        return self.session.post(
+            self.subject_selection_url, data=data, headers=self.headers, stream=True)
+
+    def open_group(self, code, target_val):
+        data = {"mainForm": "mainForm", "mainForm:basicSearchSubjectCode": code,
+                f"mainForm:basicSearchTable:0:basicSearchSubjectGroup_": target_val,
+                f"mainForm:basicSearchTable:0:basicSearchAddSubjectButton_": "+",
+                "javax.faces.ViewState": self.view_state}
+        self.trace.mark(f"{code}: add group")
+        return self.session.post(
+            self.subject_selection_url, data=data, headers=self.headers, stream=True)
+
+    def resolve_group(self, options, group):
+        for value, text in options:
+            if group in text:
+                return value
+        return None
+
+    def resolve_candidates(self, code, options, alternatives):
+        # Ordered (option value, group, component sets) for every fallback
+        # group offered on the search page
+        candidates, missing = [], []
+        for group, comps in alternatives:
+            value = self.resolve_group(options, group)
+            if not value:
+                if group not in missing:
+                    missing.append(group)
+                continue
+            for c in candidates:
+                if c[0] == value:
+                    c[2].append(comps)
+                    break
+            else:
+                candidates.append((value, group, [comps]))
+        if missing and candidates:
+            logger.info(f"{code}: group {', '.join(missing)} not offered, trying fallbacks.")
+        return candidates
+
+    def resolve_component_sets(self, rows, sets, partial=False):
+        # First set whose every code is on exactly one row. With partial
+        # (a row without fallbacks) whatever the first set matches, as a
+        # single set always did; otherwise no indices, so the next group is
+        # tried. Returns (set, indices, problems with that set).
+        with self.trace.parse():
+            index = index_components(rows)
+            for comps in sets:
+                indices, missing, ambiguous = lookup_components(index, comps)
+                if comps and not missing and not ambiguous:
+                    return comps, indices, []
+            comps = sets[0]
+            indices, missing, ambiguous = lookup_components(index, comps)
+        if not partial:
+            indices = []
+        problems = []
+        if missing:
+            problems.append(f"not on the page: {', '.join(missing)}")
+        if ambiguous:
+            problems.append(f"on more than one row: {', '.join(ambiguous)}")
+        return comps, indices, problems
+
+    def group_candidates(self, code, res, options, alternatives, plan):
+        # Lazily yields the groups to try, all from the one search response:
+        # the planned group first (checked on raw bytes), then the live
+        # fallbacks, which are only parsed if the plan does not work out.
+        planned = None
+        if plan:
+            with self.trace.parse():
+                if plan_group_matches(res.content, plan):
+                    planned = plan["group_value"]
+                else:
+                    logger.info(f"{code}: search page differs from plan, resolving live.")
+            if planned:
+                sets = [c for g, c in alternatives if g == plan["group"]]
+                yield planned, plan["group"], [plan["components"]] + sets, plan
+        if options is None:
+            with self.trace.parse():
+                options = self.extractor.extract(decode_page(res), (GROUP_OPTIONS,))[GROUP_OPTIONS]
+        for value, group, sets in self.resolve_candidates(code, options, alternatives):
+            if value != planned:
+                yield value, group, sets, None
+
+    def add_to_cart(self, code, target_val, indices):
+        comp_data = {"mainForm": "mainForm", "mainForm:selectCompSubjectGroup": target_val,
+                     "mainForm:selectButton": "Add to Cart", "javax.faces.ViewState": self.view_state}
+        for i in indices:
+            comp_data[f"mainForm:ComponentTable:{i}:selectCompSelected_"] = "on"
+        self.trace.mark(f"{code}: cart")
+        res = self.session.post(
+            self.component_selection_url, data=comp_data, headers=self.headers, stream=True)
+        self.read_page(res)
+        with self.trace.parse():
+            return cart_rejection(res.content, code, res.encoding)
+
+    def add_subject(self, code, group, comps, plan=None):
+        self.retryable = False
+        try:
+            logger.info(f"Processing: {code} (Group: {group})")
+            alternatives = parse_alternatives(group, comps)
+            res = self.search_subject(code)
+            if plan:
+                # Only the ViewState is parsed; the plan is checked on raw bytes
+                self.read_page(res)
+                options = None
+            else:
+                options = self.read_page(res, GROUP_OPTIONS)[GROUP_OPTIONS]
+            search_view_state = self.view_state
+            tried = rejected = 0
+            for target_val, grp, sets, grp_plan in self.group_candidates(
+                    code, res, options, alternatives, plan):
+                if tried:
+                    # Back to the search page's view instead of searching again
+                    logger.info(f"{code}: trying fallback group {grp}.")
+                    self.view_state = search_view_state
+                tried += 1
+                page = self.open_group(code, target_val)
+                indices = None
+                if grp_plan:
+                    self.read_page(page)
+                    with self.trace.parse():
+                        if plan_components_match(page.content, grp_plan,
+                                                 page_encoding(page, page.content)):
+                            indices = grp_plan["component_indices"]
+                        else:
+                            logger.info(f"{code}: component page differs from plan, resolving live.")
+                            rows = self.extractor.extract(
+                                decode_page(page), (COMPONENT_ROWS,))[COMPONENT_ROWS]
+                else:
+                    rows = self.read_page(page, COMPONENT_ROWS)[COMPONENT_ROWS]
+                if indices is None:
+                    _, indices, problems = self.resolve_component_sets(
+                        rows, sets, partial=len(alternatives) == 1)
+                    if problems:
+                        logger.warning(f"{code} group {grp}: components {'; '.join(problems)}")
+                if not indices:
+                    continue
+                reason = self.add_to_cart(code, target_val, indices)
+                if not reason:
+                    logger.info(f"Successfully added {code} (group {grp}) to cart.")
+                    return True
+                rejected += 1
+                logger.warning(f"{code} group {grp} was not added: {reason}")
+            if not tried:
+                logger.warning(f"Group {group} not found for {code}")
+            elif rejected:
+                logger.warning(f"No group of {code} could be added to the cart")
+            else:
+                logger.warning(f"No matching components for {code}")
+            return False
+        except Exception as e:
+            logger.error(f"Error adding {code}: {e}")
+            self.retryable = isinstance(e, TRANSIENT_ERRORS)
+            return False
+        finally:
+            self.trace.end()
+
+    def prepare_plan(self, code, group, comps):
+        # Dry run: resolve the group option and component checkboxes, then
+        # go back to the subject page without adding anything to the cart.
+        # With fallbacks, the first alternative that resolves is planned.
+        try:
+            logger.info(f"Planning: {code} (Group: {group})")
+            page = self.read_page(self.search_subject(code), GROUP_OPTIONS)
+            alternatives = parse_alternatives(group, comps)
+            candidates = self.resolve_candidates(code, page[GROUP_OPTIONS], alternatives)
+            if not candidates:
+                logger.warning(f"Group {group} not found for {code}")
+                return None
+            search_view_state = self.view_state
+            for n, (target_val, grp, sets) in enumerate(candidates):
+                if n:
+                    self.view_state = search_view_state
+                page = self.read_page(self.open_group(code, target_val), COMPONENT_ROWS)
+                chosen, indices, problems = self.resolve_component_sets(
+                    page[COMPONENT_ROWS], sets, partial=len(alternatives) == 1)
+                if problems:
+                    logger.warning(f"{code} group {grp}: components {'; '.join(problems)}")
+                if indices:
+                    return {"key": plan_key(code, group, comps), "code": code, "group": grp,
+                            "components": chosen, "group_value": target_val,
+                            "component_indices": indices}
+            logger.warning(f"No matching components for {code}")
+            return None
+        except Exception as e:
+            logger.error(f"Error planning {code}: {e}")
+            return None
+        finally:
+            self.trace.end()
+            self.refresh_view_state()
+
+    def finalize(self):
+        self.retryable = False
+        try:
+            logger.info("Step 6: Confirming Shopping Cart...")
+            self.trace.mark("preview")
+            data = {"mainForm": "mainForm", "mainForm:confirmButton": "Proceed to Preview",
+                    "javax.faces.ViewState": self.view_state}
+            res = self.session.post(
+                self.subject_selection_url, data=data, headers=self.headers, stream=True)
+            self.read_page(res)
+            data = {"mainForm": "mainForm", "mainForm:confirmButton": "Confirm",
+                    "javax.faces.ViewState": self.view_state}
+            self.trace.mark("confirm")
+            res = self.session.post(
+                self.preview_confirmation_url, data=data, headers=self.headers)
+            with self.trace.parse():
+                ok = has_marker(res.content, page_encoding(res, res.content), SUCCESS_MARKERS)
+            if ok:
+                logger.info(">>> ALL TASKS COMPLETED SUCCESSFULLY! <<<")
+                return True
+            self.retryable = res.status_code >= 500
+            return False
+        except Exception as e:
+            logger.error(f"Final submission failed: {e}")
+            self.retryable = isinstance(e, TRANSIENT_ERRORS)
+            return False
+        finally:
+            self.trace.end()
+
+
+# ==========================================
+# 1. Registration Pipeline
+# ==========================================
+STEP_BUDGETS = {"login": 30.0, "semester": 20.0, "subject": 20.0, "finalize": 30.0}
+LOGIN, SEMESTER, SUBJECTS, FINALIZE, DONE = "login", "semester", "subjects", "finalize", "done"
+MAX_RETRIES = 3
+RETRY_DELAY = 1.0
+
+
+def file_stamp():
+    # Milliseconds too, so back-to-back runs do not overwrite each other
+    now = datetime.now()
+    return f"{now:%Y%m%d-%H%M%S}-{now.microsecond // 1000:03d}"
+
+
+class Checkpoint:
+    # Last known-good point of the JSF flow; a failed step resumes from here
+    def __init__(self):
+        self.stage = LOGIN
+        self.cookies = None
+        self.view_state = None
+        self.in_cart = []
+        self.skipped = []
+
+    def save(self, bot, stage):
+        self.stage = stage
+        self.cookies = bot.session.cookies.copy()
+        self.view_state = bot.view_state
+
+    def restore(self, bot):
+        bot.session.cookies.clear()
+        if self.cookies is not None:
+            bot.session.cookies.update(self.cookies)
+        bot.view_state = self.view_state
+
+    def new_session(self):
+        # The cart lives in the server session, so it is gone as well
+        if self.in_cart:
+            logger.info(f"Cart was lost with the session; re-adding {', '.join(self.in_cart)}.")
+        self.in_cart = []
+        self.stage, self.cookies, self.view_state = LOGIN, None, None
+
+
+class RegistrationRun:
+    # One login-to-confirm run, shared by the GUI worker thread and the CLI.
+    def __init__(self, uid, pwd, subjects, start_at=None, pre_login=True, plan_only=False,
+                 revalidate_before=5.0, keepalive_every=120.0, clock_probes=4,
+                 run_budget=120.0, step_budgets=None, max_retries=MAX_RETRIES, capture=False,
+                 redact=(), session_cache=True, pacing=ADAPTIVE, min_interval=MIN_INTERVAL, on_clock=None):
+        self.uid, self.pwd, self.subjects = uid, pwd, subjects
+        # plan_only: dry run that resolves and saves the plan, adds nothing
+        self.plan_only = plan_only
+        self.plan = {} if plan_only else load_plan()
+        # start_at: target in server time (epoch seconds). With pre_login the
+        # worker logs in right away and only adds subjects at that time.
+        self.start_at = start_at
+        self.pre_login = pre_login
+        self.revalidate_before = revalidate_before
+        self.keepalive_every = keepalive_every
+        self.clock_probes = clock_probes
+        # Seconds; the run budget starts at the scheduled time (or right away)
+        self.run_budget = run_budget
+        self.step_budgets = dict(STEP_BUDGETS, **(step_budgets or {}))
+        self.max_retries = max_retries
+        self.capture = capture
+        self.redact = redact
+        # session_cache: keep the login cookies (encrypted) for the next run
+        self.cookie_cache = None
+        if session_cache:
+            self.cookie_cache = CookieCache(get_session_cache_path(), uid, pwd)
+            if not self.cookie_cache.enabled:
+                logger.info("Session cache off: install 'cryptography' to enable it.")
+                self.cookie_cache = None
+        self.cache_checked = False
+        self.logged_in = False
+        # Pause between subjects; see pacing.py
+        self.pacer = Pacer(pacing, min_interval)
+        self.on_clock = on_clock
+        self.mode = "plan" if plan_only else ("scheduled" if start_at else "now")
+        # Outcome per subject, for the run history
+        self.results = []
+        self.abort_event = threading.Event()
+
+    def abort(self):
+        self.abort_event.set()
+
+    def failed(self, bot, msg):
+        if bot.deadline.cancelled:
+            return "Run cancelled."
+        if bot.deadline.exceeded:
+            return f"{msg} {bot.deadline.exceeded}"
+        return msg
+
+    def run_stage(self, bot, cp):
+        # Runs the checkpoint's stage; returns (error, retryable)
+        if cp.stage == LOGIN:
+            if self.reuse_session(bot):
+                cp.save(bot, SUBJECTS)
+                return None, False
+            with bot.deadline.step("login", self.step_budgets["login"]):
+                ok = bot.login()
+            if not ok:
+                return self.failed(bot, "Login failed."), bot.retryable
+            cp.save(bot, SEMESTER)
+        elif cp.stage == SEMESTER:
+            with bot.deadline.step("semester selection", self.step_budgets["semester"]):
+                ok = bot.select_acad_year_sem()
+            if not ok:
+                return self.failed(bot, "Semester selection failed."), bot.retryable
+            self.logged_in = True
+            cp.save(bot, SUBJECTS)
+        elif cp.stage == SUBJECTS:
+            return self.add_subjects(bot, cp)
+        elif cp.stage == FINALIZE:
+            with bot.deadline.step("finalize", self.step_budgets["finalize"]):
+                ok = bot.finalize()
+            if not ok:
+                return self.failed(bot, "Failed to submit cart."), bot.retryable
+            cp.stage = DONE
+        return None, False
+
+    def reuse_session(self, bot):
+        # Only before the first login of a run: one subject page request
+        # tells whether the cached session is still good.
+        if self.cookie_cache is None or self.cache_checked:
+            return False
+        self.cache_checked = True
+        if not self.cookie_cache.load(bot.session, bot.base_url):
+            return False
+        alive = bot.refresh_view_state()
+        if alive:
+            logger.info("Reusing the saved session; login skipped.")
+            self.logged_in = True
+            return True
+        bot.session.cookies.clear()
+        if alive is False:
+            logger.info("Saved session has expired. Logging in...")
+            self.cookie_cache.clear()
+        return False
+
+    def store_session(self, bot):
+        try:
+            self.cookie_cache.save(bot.session, bot.base_url)
+        except Exception as e:
+            logger.warning(f"Could not save the session: {e}")
+
+    def add_subjects(self, bot, cp):
+        # Only subjects not yet in the cart (or given up on) are attempted
+        todo = [s for s in self.subjects if s[0] not in cp.in_cart and s[0] not in cp.skipped]
+        for n, s in enumerate(todo, 1):
+            code = s[0]
+            self.pacer.begin()
+            with bot.deadline.step(code, self.step_budgets["subject"]):
+                added = bot.add_subject(s[0], s[1], s[2], plan=self.plan.get(plan_key(*s)))
+            self.pacer.end()
+            if added:
+                cp.in_cart.append(code)
+                cp.save(bot, SUBJECTS)
+            elif bot.deadline.cancelled:
+                return "Run cancelled.", False
+            elif bot.retryable and not bot.deadline.exceeded:
+                return self.failed(bot, f"Adding {code} failed."), True
+            else:
+                # Out of budget counts as given up, so one stalled subject
+                # does not hold up the ones after it. The bot may be left on
+                # a component page; go on from the last good subject page.
+                cp.skipped.append(code)
+                bot.view_state = cp.view_state
+                if bot.deadline.exceeded:
+                    logger.warning(f"Skipping {code}: {bot.deadline.exceeded}")
+            if bot.deadline.run_expired():
+                return bot.deadline.describe(), False
+            if not self.pace(bot, last=n == len(todo)):
+                return "Run cancelled.", False
+        if not cp.in_cart:
+            return self.failed(bot, "No subjects were added."), False
+        cp.save(bot, FINALIZE)
+        return None, False
+
+    def pace(self, bot, last=False):
+        # Waits before the next subject request; False if cancelled meanwhile.
+        # The minimum interval is between subjects, so after the last one
+        # adaptive pacing only holds the confirmation for a Retry-After.
+        if last and self.pacer.mode == ADAPTIVE:
+            delay = self.pacer.retry_after()
+        else:
+            delay = self.pacer.delay()
+        remaining = bot.deadline.remaining()
+        if remaining is not None:
+            delay = min(delay, max(remaining, 0.0))
+        if delay >= 1.0:
+            logger.info(f"Pacing: waiting {delay:.1f}s before the next request.")
+        return not delay or not self.abort_event.wait(delay)
+
+    def recover(self, bot, cp, verify):
+        # Resume from the checkpoint's ViewState directly; after repeated
+        # failures first check that the session itself is still alive.
+        cp.restore(bot)
+        if cp.stage == LOGIN or not verify:
+            return
+        alive = bot.refresh_view_state()
+        if alive:
+            cp.save(bot, cp.stage)
+        elif alive is False:
+            logger.info("Session expired. Logging in again...")
+            cp.new_session()
+
+    def drive(self, bot, cp, until=DONE):
+        retries = 0
+        while cp.stage != until:
+            stage = cp.stage
+            err, retryable = self.run_stage(bot, cp)
+            if not err:
+                continue
+            if bot.deadline.cancelled:
+                return "Run cancelled."
+            if not retryable or retries >= self.max_retries or bot.deadline.run_expired():
+                return err
+            retries += 1
+            delay = max(RETRY_DELAY * 2 ** (retries - 1), self.pacer.retry_after())
+            remaining = bot.deadline.remaining()
+            if remaining is not None:
+                delay = min(delay, max(remaining, 0.0))
+            logger.warning(f"{err} Resuming at '{stage}' in {delay:g}s "
+                           f"(retry {retries}/{self.max_retries}).")
+            if self.abort_event.wait(delay):
+                return "Run cancelled."
+            if bot.deadline.run_expired():
+                return f"{err} {bot.deadline.describe()}"
+            self.recover(bot, cp, verify=retries > 1)
+        return None
+
+    def wait_until(self, when):
+        return wait_until(when, self.abort_event)
+
+    def report_clock(self, bot):
+        if bot.clock.known and self.on_clock:
+            self.on_clock(bot.clock.offset, bot.clock.error)
+
+    def calibrate(self, bot, before):
+        # Time a few session checks so their Date headers straddle a second
+        # boundary; each one roughly halves the offset uncertainty.
+        for _ in range(self.clock_probes):
+            if not bot.clock.known or bot.clock.error < 0.005:
+                break
+            probe_at = bot.clock.next_probe()
+            if probe_at >= before or not self.wait_until(probe_at):
+                break
+            bot.refresh_view_state()
+        logger.info(f"Clock: {bot.clock.describe()}")
+        self.report_clock(bot)
+
+    def pre_arm(self, bot, cp):
+        logger.info("Pre-arm: logging in ahead of the scheduled time...")
+        err = self.drive(bot, cp, until=SUBJECTS)
+        if err:
+            return err
+        check_at = self.start_at - self.revalidate_before
+        self.calibrate(bot, check_at)
+        logger.info("Pre-armed. Waiting for the scheduled time...")
+        while time.time() < check_at:
+            if not self.wait_until(min(check_at, time.time() + self.keepalive_every)):
+                return "Schedule stopped."
+            # Also keeps eStudent from dropping the idle session
+            alive = bot.refresh_view_state()
+            if alive:
+                cp.save(bot, SUBJECTS)
+            elif alive is None:
+                logger.warning("Keep-alive failed; checking again at the next one.")
+            else:
+                logger.info("Pre-armed session expired. Logging in again...")
+                cp.new_session()
+                err = self.drive(bot, cp, until=SUBJECTS)
+                if err:
+                    return err
+        self.report_clock(bot)
+        return None
+
+    def wait_for_start(self, bot):
+        if not self.pre_login:
+            bot.prewarm()
+        # start_at is in server time; trigger on the local clock it maps to
+        if not self.wait_until(self.start_at - bot.clock.offset):
+            return "Schedule stopped."
+        late = (time.time() + bot.clock.offset - self.start_at) * 1000
+        bot.deadline.start_run(self.run_budget)
+        bot.trace.mark("scheduled time reached")
+        bot.trace.end()
+        err = f" ±{bot.clock.error * 1000:.0f} ms" if bot.clock.known else ""
+        logger.info(f"Scheduled time reached ({late:+.1f} ms{err}).")
+        return None
+
+    def report_trace(self, bot):
+        logger.info("Run timeline:")
+        for line in bot.trace.timeline():
+            logger.info(line)
+        for line in bot.trace.connection_summary("scheduled time reached") or []:
+            logger.info(line)
+        path = get_traces_dir() / f"run-{file_stamp()}.json"
+        try:
+            bot.trace.save(path)
+            logger.info(f"Timing saved to {path}")
+        except Exception as e:
+            logger.warning(f"Could not save timing: {e}")
+
+    def save_capture(self, bot):
+        path = get_captures_dir() / f"capture-{file_stamp()}.zip"
+        try:
+            count = bot.recorder.save(path, {"version": APP_VERSION, "mode": self.mode,
+                                             "subjects": self.subjects})
+            logger.info(f"Captured {count} pages to {path}")
+        except Exception as e:
+            logger.warning(f"Could not save page capture: {e}")
+
+    def record_history(self, bot, ok, msg):
+        path = get_history_path()
+        try:
+            previous = load_runs(path)
+            entry = summarize_run(bot.trace.to_dict(), APP_VERSION, self.mode, ok, msg,
+                                  self.results)
+            append_run(path, entry)
+        except Exception as e:
+            logger.warning(f"Could not update run history: {e}")
+            return
+        for line in compare(entry, previous):
+            logger.info(line)
+
+    def execute(self, bot):
+        cp = Checkpoint()
+        bot.session.hooks["response"].append(self.pacer.observe)
+        if not self.start_at:
+            bot.deadline.start_run(self.run_budget)
+            err = None
+        elif self.pre_login:
+            err = self.pre_arm(bot, cp) or self.wait_for_start(bot)
+        else:
+            err = self.wait_for_start(bot)
+        if err:
+            return False, err
+        if self.plan_only:
+            err = self.drive(bot, cp, until=SUBJECTS)
+            if err:
+                return False, err
+            entries = []
+            for s in self.subjects:
+                with bot.deadline.step(s[0], self.step_budgets["subject"]):
+                    entry = bot.prepare_plan(*s)
+                self.results.append({"code": s[0], "added": False, "planned": bool(entry)})
+                if entry:
+                    entries.append(entry)
+                elif bot.deadline.cancelled:
+                    return False, "Run cancelled."
+            save_plan(entries)
+            return bool(entries), f"Plan prepared for {len(entries)}/{len(self.subjects)} subjects."
+        planned = sum(plan_key(*s) in self.plan for s in self.subjects)
+        if planned:
+            logger.info(f"Using saved plan for {planned}/{len(self.subjects)} subjects.")
+        err = self.drive(bot, cp)
+        self.results = [{"code": s[0], "added": s[0] in cp.in_cart} for s in self.subjects]
+        if err:
+            return False, err
+        return True, "Process finished successfully."
+
+    def run(self):
+        bot = CourseRegistrationSystem(self.uid, self.pwd, deadline=Deadline(self.abort_event),
+                                       capture=self.capture, redact=self.redact)
+        ok, msg = self.execute(bot)
+        if not self.abort_event.is_set():
+            self.report_trace(bot)
+            self.record_history(bot, ok, msg)
+        if bot.recorder:
+            self.save_capture(bot)
+        # Saved even after a failed run, so that a quick retry skips the login
+        if self.cookie_cache and self.logged_in:
+            self.store_session(bot)
+        return ok, msg
@@ -0,0 +1,88 @@
+# Precise triggering for scheduled runs.
+#
+# ClockOffset estimates how far the eStudent server clock is from ours using
+# the Date headers of responses we receive anyway. A Date header only has
+# one-second resolution, but the server stamped it somewhere between our send
+# and receive times, so every response bounds the offset to an interval;
+# intersecting them (and timing a few requests to straddle a second
+# boundary) narrows it to the round-trip time.
+import math
+import time
+from email.utils import parsedate_to_datetime
+
+SPIN_MARGIN = 0.02
+
+
+class ClockOffset:
+    def __init__(self):
+        self.low = None
+        self.high = None
+        self.samples = 0
+        self.min_rtt = None
+
+    def observe(self, t_send, t_recv, date_header):
+        try:
+            server = parsedate_to_datetime(date_header).timestamp()
+        except (TypeError, ValueError):
+            return
+        # server time at the stamp is in [server, server + 1) and the stamp
+        # happened in [t_send, t_recv] local time
+        low, high = server - t_recv, server + 1 - t_send
+        rtt = t_recv - t_send
+        self.samples += 1
+        self.min_rtt = rtt if self.min_rtt is None else min(self.min_rtt, rtt)
+        if self.low is None or low > self.high or high < self.low:
+            # First sample, or one of the clocks was stepped: start over
+            self.low, self.high = low, high
+        else:
+            self.low, self.high = max(self.low, low), min(self.high, high)
+
+    def observe_response(self, res, *args, **kwargs):
+        t_recv = time.time()
+        self.observe(t_recv - res.elapsed.total_seconds(),
+                     t_recv, res.headers.get("Date"))
+
+    @property
+    def known(self):
+        return self.low is not None
+
+    @property
+    def offset(self):
+        return (self.low + self.high) / 2 if self.known else 0.0
+
+    @property
+    def error(self):
+        return (self.high - self.low) / 2 if self.known else None
+
+    def next_probe(self, now=None):
+        # Local send time that makes the server stamp its Date right at a
+        # second boundary under the current estimate, halving the interval.
+        now = time.time() if now is None else now
+        half_rtt = (self.min_rtt or 0.0) / 2
+        boundary = math.ceil(now + self.offset + half_rtt + 0.05)
+        return boundary - self.offset - half_rtt
+
+    def describe(self):
+        if not self.known:
+            return "server clock offset unknown"
+        return f"server clock offset {self.offset * 1000:+.0f} ms (±{self.error * 1000:.0f} ms)"
+
+
+def wait_until(when, abort_event=None):
+    # Sleep until local wall time `when`. The deadline is converted to the
+    # monotonic performance counter once, so clock adjustments during the
+    # wait are ignored; the last few milliseconds are spun for precision.
+    deadline = time.perf_counter() + (when - time.time())
+    while True:
+        left = deadline - time.perf_counter()
+        if left <= SPIN_MARGIN:
+            break
+        timeout = min(left - SPIN_MARGIN, 0.5)
+        if abort_event is not None:
+            if abort_event.wait(timeout):
+                return False
+        else:
+            time.sleep(timeout)
+    while time.perf_counter() < deadline:
+        pass
+    return True
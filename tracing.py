@@ -0,0 +1,198 @@
+# Per-request timing for a registration run.
+#
+# TracingAdapter is mounted on the bot's requests.Session and records every
+# HTTP exchange (redirect hops included) into the current step of a RunTrace:
+# connect time (None when a kept-alive connection was reused) and whether
+# the TLS session was resumed, time to first byte, download time and bytes
+# received. The bot adds parse time (with the part spent decoding bytes to
+# text shown on its own) and the ViewState-update result per step.
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+_local = threading.local()
+
+
+# ==========================================
+# 1. Connection timing
+# ==========================================
+class _TimedConnectMixin:
+    def connect(self):
+        t0 = time.perf_counter()
+        super().connect()
+        spent = getattr(_local, "connect_time", None) or 0.0
+        _local.connect_time = spent + time.perf_counter() - t0
+        _local.tls_resumed = getattr(self.sock, "session_reused", None)
+
+
+class TimedHTTPConnection(_TimedConnectMixin, HTTPConnection):
+    pass
+
+
+class TimedHTTPSConnection(_TimedConnectMixin, HTTPSConnection):
+    pass
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TracingAdapter(HTTPAdapter):
+    def __init__(self, trace, *args, **kwargs):
+        self.trace = trace
+        super().__init__(*args, **kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": TimedHTTPConnectionPool, "https": TimedHTTPSConnectionPool}
+
+    def send(self, request, stream=False, **kwargs):
+        _local.connect_time = None
+        _local.tls_resumed = None
+        t0 = time.perf_counter()
+        res = super().send(request, stream=stream, **kwargs)
+        ttfb = time.perf_counter() - t0
+        entry = self.trace.add_request(request.method, request.url, res.status_code,
+                                       _local.connect_time, ttfb, _local.tls_resumed)
+        res.trace_entry = entry
+        if not stream:
+            # Session.send would read the body right after this anyway
+            t0 = time.perf_counter()
+            res.content
+            self.trace.finish_download(res, time.perf_counter() - t0)
+        return res
+
+
+# ==========================================
+# 2. Run trace
+# ==========================================
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 2)
+
+
+class RunTrace:
+    def __init__(self):
+        self.started_at = time.time()
+        self.t0 = time.perf_counter()
+        self.steps = []
+        self.current = None
+        self.current_t0 = None
+        self.lock = threading.Lock()
+
+    def _now_ms(self):
+        return _ms(time.perf_counter() - self.t0)
+
+    def mark(self, name):
+        # Starts a new step; the previous one ends here
+        now = time.perf_counter()
+        self._close(now)
+        self.current = {"step": name, "start_ms": _ms(now - self.t0), "duration_ms": None,
+                        "parse_ms": 0.0, "decode_ms": 0.0, "view_state": None, "requests": []}
+        self.current_t0 = now
+        with self.lock:
+            self.steps.append(self.current)
+
+    def end(self):
+        self._close(time.perf_counter())
+        self.current = None
+
+    def _close(self, now):
+        if self.current is not None:
+            self.current["duration_ms"] = _ms(now - self.current_t0)
+
+    def _target(self):
+        if self.current is None:
+            # Requests outside any named step still show up
+            self.mark("(untracked)")
+        return self.current
+
+    def add_request(self, method, url, status, connect, ttfb, tls_resumed=None):
+        entry = {"method": method, "url": url, "status": status,
+                 "reused": connect is None, "connect_ms": _ms(connect),
+                 "tls_resumed": tls_resumed, "ttfb_ms": _ms(ttfb),
+                 "download_ms": None, "bytes": None}
+        self._target()["requests"].append(entry)
+        return entry
+
+    def finish_download(self, res, seconds):
+        entry = getattr(res, "trace_entry", None)
+        if entry is not None:
+            entry["download_ms"] = _ms(seconds)
+            entry["bytes"] = len(res.content or b"")
+
+    def add_parse(self, seconds, decode=0.0):
+        if self.current is not None:
+            self.current["parse_ms"] = round(self.current["parse_ms"] + seconds * 1000, 3)
+            self.current["decode_ms"] = round(self.current["decode_ms"] + decode * 1000, 3)
+
+    @contextmanager
+    def parse(self):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_parse(time.perf_counter() - t0)
+
+    def note_view_state(self, ok):
+        if self.current is not None:
+            self.current["view_state"] = ok
+
+    # ---- reporting ----
+    def total_ms(self):
+        return max((s["start_ms"] + (s["duration_ms"] or 0) for s in self.steps), default=0.0)
+
+    def to_dict(self):
+        self.end()
+        return {"started_at": self.started_at,
+                "total_ms": round(self.total_ms(), 2), "steps": self.steps}
+
+    def save(self, path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.to_dict(), indent=2), encoding="utf-8")
+
+    def timeline(self):
+        self.end()
+        lines = [f"{'at':>8} {'took':>7} {'conn':>6} {'ttfb':>7} {'down':>6} {'parse':>6} "
+                 f"{'dec':>5} {'KB':>6} VS  step (ms)"]
+        for s in self.steps:
+            reqs = s["requests"]
+            conn = sum(r["connect_ms"] or 0 for r in reqs)
+            ttfb = sum(r["ttfb_ms"] or 0 for r in reqs)
+            down = sum(r["download_ms"] or 0 for r in reqs)
+            kb = sum(r["bytes"] or 0 for r in reqs) / 1024
+            vs = {True: "ok", False: "NO", None: "-"}[s["view_state"]]
+            cold = [r for r in reqs if not r["reused"]]
+            warm = ""
+            if cold:
+                resumed = any(r["tls_resumed"] for r in cold)
+                warm = " [new conn, TLS resumed]" if resumed else " [new conn]"
+            hops = f" x{len(reqs)}" if len(reqs) > 1 else ""
+            lines.append(f"{s['start_ms']:>8.0f} {s['duration_ms'] or 0:>7.1f} {conn:>6.1f} {ttfb:>7.1f} {down:>6.1f} "
+                         f"{s['parse_ms']:>6.2f} {s['decode_ms']:>5.2f} {kb:>6.1f} {vs:<3} "
+                         f"{s['step']}{hops}{warm}")
+        lines.append(f"Total: {self.total_ms():.0f} ms")
+        return lines
+
+    def connection_summary(self, after_step):
+        # Warm-connection report for the requests made after a marker step
+        names = [s["step"] for s in self.steps]
+        if after_step not in names:
+            return None
+        reqs = [r for s in self.steps[names.index(after_step) + 1:] for r in s["requests"]]
+        cold = [r for r in reqs if not r["reused"]]
+        lines = [f"{len(reqs) - len(cold)}/{len(reqs)} requests after '{after_step}' "
+                 f"reused a warm connection."]
+        for r in cold:
+            tls = ", TLS resumed" if r["tls_resumed"] else ""
+            lines.append(f"  cold: {r['method']} {r['url']} (connect {r['connect_ms']} ms{tls})")
+        return lines
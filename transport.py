@@ -0,0 +1,107 @@
+# HTTP transport for CourseRegistrationSystem.
+#
+# One shared TLS context (CA bundle loaded once instead of per connection;
+# cert_verify keeps requests from pointing urllib3 at the bundle file again)
+# that also remembers TLS sessions per host, so a new connection made after
+# a kept-alive one was dropped can resume instead of doing a full handshake.
+# The adapter sizes the pools for the two hosts we talk to and does not
+# retry on its own; compressed responses are requested explicitly. Request
+# timeouts come from the run's Deadline.
+import ssl
+import threading
+import weakref
+
+import requests
+from requests.exceptions import Timeout
+from requests.utils import DEFAULT_CA_BUNDLE_PATH
+from urllib3.util import make_headers
+
+from deadline import BudgetExceeded
+from tracing import TracingAdapter
+
+ACCEPT_ENCODING = make_headers(accept_encoding=True)["accept-encoding"]
+
+
+class TLSSessionContext(ssl.SSLContext):
+    def __init__(self, *args, **kwargs):
+        self._lock = threading.Lock()
+        self._sockets = {}
+        self._sessions = {}
+
+    def refresh(self):
+        # TLS 1.3 tickets arrive after the handshake; pick them up from the
+        # live sockets so they outlive the connection
+        with self._lock:
+            for host, ref in self._sockets.items():
+                session = getattr(ref(), "session", None)
+                if session is not None:
+                    self._sessions[host] = session
+
+    def wrap_socket(self, sock, *args, server_hostname=None, session=None, **kwargs):
+        if session is None and server_hostname:
+            self.refresh()
+            session = self._sessions.get(server_hostname)
+        ssock = super().wrap_socket(sock, *args, server_hostname=server_hostname,
+                                    session=session, **kwargs)
+        if server_hostname:
+            with self._lock:
+                self._sockets[server_hostname] = weakref.ref(ssock)
+                if ssock.session is not None:
+                    self._sessions[server_hostname] = ssock.session
+        return ssock
+
+
+def create_tls_context():
+    ctx = TLSSessionContext(ssl.PROTOCOL_TLS_CLIENT)
+    ctx.minimum_version = ssl.TLSVersion.TLSv1_2
+    ctx.load_verify_locations(DEFAULT_CA_BUNDLE_PATH)
+    return ctx
+
+
+class TunedAdapter(TracingAdapter):
+    def __init__(self, trace, deadline=None, ssl_context=None, pool_connections=4, pool_maxsize=2):
+        self.deadline = deadline
+        self.ssl_context = ssl_context or create_tls_context()
+        super().__init__(trace, pool_connections=pool_connections,
+                         pool_maxsize=pool_maxsize, max_retries=0)
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs.setdefault("ssl_context", self.ssl_context)
+        super().init_poolmanager(*args, **kwargs)
+
+    def build_connection_pool_key_attributes(self, request, verify, cert=None):
+        host_params, pool_kwargs = super().build_connection_pool_key_attributes(
+            request, verify, cert)
+        if host_params["scheme"] == "https" and verify is True and not cert:
+            pool_kwargs["ssl_context"] = self.ssl_context
+        return host_params, pool_kwargs
+
+    def cert_verify(self, conn, url, verify, cert):
+        # With ca_certs set, urllib3 reloads the bundle into the shared
+        # context for every new connection; it already holds it
+        super().cert_verify(conn, url, verify, cert)
+        if conn.conn_kw.get("ssl_context") is self.ssl_context:
+            conn.ca_certs = conn.ca_cert_dir = None
+
+    def send(self, request, stream=False, timeout=None, **kwargs):
+        if timeout is None and self.deadline is not None:
+            timeout = self.deadline.timeout()
+        try:
+            res = super().send(request, stream=stream, timeout=timeout, **kwargs)
+        except Timeout as e:
+            left = self.deadline.remaining() if self.deadline is not None else None
+            if left is not None and left < 0.05:
+                raise BudgetExceeded(self.deadline.describe()) from e
+            raise
+        self.ssl_context.refresh()
+        return res
+
+
+def build_session(trace, deadline=None):
+    session = requests.Session()
+    adapter = TunedAdapter(trace, deadline)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers["Accept-Encoding"] = ACCEPT_ENCODING
+    session.headers["Connection"] = "keep-alive"
+    return session